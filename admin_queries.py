@@ -0,0 +1,218 @@
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from models import db, Order, CouponUsage, Promotion, User, normalize_phone
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+ORDER_STATUSES = ('pending', 'confirmed', 'preparing', 'out_for_delivery', 'delivered', 'cancelled')
+USER_ROLES = ('customer', 'admin', 'delivery')
+# Shortest search term the PostgreSQL trigram index can serve as a substring match
+MIN_TRIGRAM_TERM = 3
+
+# rows for this page; cursors for the neighbouring pages (None at either end)
+KeysetPage = namedtuple('KeysetPage', ['rows', 'older', 'newer'])
+
+OrderFilters = namedtuple('OrderFilters', ['status', 'date_from', 'date_to'])
+CouponUsageFilters = namedtuple('CouponUsageFilters', ['search', 'coupon', 'user_type', 'date', 'sort'])
+UserFilters = namedtuple('UserFilters', ['role', 'status', 'search'])
+
+
+def encode_cursor(created_at, row_id):
+    return f'{created_at.isoformat()}_{row_id}'
+
+
+def decode_cursor(token):
+    """(created_at, id) from a cursor token, or None if it is missing or malformed"""
+    try:
+        created_at, row_id = token.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Requested page size clamped to 1..MAX_PAGE_SIZE"""
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_page(query, created_column, id_column, before=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """Newest-first page of query seeking on (created_at, id), so every page costs the same
+
+    before: cursor of the last row seen, for the next (older) page
+    after: cursor of the first row seen, for the previous (newer) page
+    """
+    key = db.tuple_(created_column, id_column)
+    # LIMIT is rendered inline: with a bound LIMIT SQLite walks the sort index even when
+    # a selective filter (a search term) has an index of its own
+    fetch = db.bindparam('page_limit', limit + 1, literal_execute=True)
+    after_key = decode_cursor(after) if after else None
+    before_key = decode_cursor(before) if before else None
+
+    if after_key:
+        # Walk forward from the cursor, then flip back to newest first
+        rows = query.filter(key > after_key)\
+                    .order_by(created_column.asc(), id_column.asc())\
+                    .limit(fetch).all()
+        has_newer = len(rows) > limit
+        rows = rows[:limit][::-1]
+        has_older = True
+    else:
+        if before_key:
+            query = query.filter(key < before_key)
+        rows = query.order_by(created_column.desc(), id_column.desc()).limit(fetch).all()
+        has_older = len(rows) > limit
+        rows = rows[:limit]
+        has_newer = before_key is not None
+
+    def cursor(row):
+        return encode_cursor(getattr(row, created_column.key), getattr(row, id_column.key))
+
+    return KeysetPage(
+        rows=rows,
+        older=cursor(rows[-1]) if rows and has_older else None,
+        newer=cursor(rows[0]) if rows and has_newer else None
+    )
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+
+def order_filters(args):
+    """Order list filters from request args (status, from, to as YYYY-MM-DD IST days)"""
+    status = args.get('status', 'all')
+    return OrderFilters(
+        status=status if status in ORDER_STATUSES else 'all',
+        date_from=_parse_date(args.get('from')),
+        date_to=_parse_date(args.get('to'))
+    )
+
+
+def filtered_orders(filters, query=None):
+    """Apply OrderFilters; (status, created_at, id) and (created_at, id) indexes cover both shapes"""
+    query = query if query is not None else Order.query
+    if filters.status != 'all':
+        query = query.filter(Order.status == filters.status)
+    if filters.date_from:
+        query = query.filter(Order.created_at >= datetime.combine(filters.date_from, datetime.min.time()))
+    if filters.date_to:
+        day_after = datetime.combine(filters.date_to, datetime.min.time()) + timedelta(days=1)
+        query = query.filter(Order.created_at < day_after)
+    return query
+
+
+def coupon_usage_filters(args):
+    """Coupon usage filters from request args (search, coupon, user_type, date, sort)"""
+    return CouponUsageFilters(
+        search=args.get('search', '').strip(),
+        coupon=args.get('coupon', 'all'),
+        user_type=args.get('user_type', 'all'),  # all, registered, guest
+        date=args.get('date', 'all'),  # all, today, week, month
+        sort=args.get('sort', 'recent')  # recent, oldest, discount_high, discount_low
+    )
+
+
+def filtered_coupon_usage(filters):
+    """Filtered, sorted CouponUsage query; the promotion join is only needed to search descriptions"""
+    query = CouponUsage.query
+    if filters.search:
+        term = f'%{filters.search}%'
+        query = query.join(Promotion).filter(
+            db.or_(
+                CouponUsage.coupon_code.ilike(term),
+                CouponUsage.username.ilike(term),
+                CouponUsage.guest_name.ilike(term),
+                CouponUsage.order_number.ilike(term),
+                Promotion.description.ilike(term)
+            )
+        )
+
+    if filters.coupon != 'all':
+        query = query.filter(CouponUsage.coupon_code == filters.coupon)
+
+    if filters.user_type == 'registered':
+        query = query.filter(CouponUsage.user_id.isnot(None))
+    elif filters.user_type == 'guest':
+        query = query.filter(CouponUsage.user_id.is_(None))
+
+    if filters.date == 'today':
+        query = query.filter(CouponUsage.used_at >= datetime.now().date())
+    elif filters.date == 'week':
+        query = query.filter(CouponUsage.used_at >= datetime.now() - timedelta(days=7))
+    elif filters.date == 'month':
+        query = query.filter(CouponUsage.used_at >= datetime.now() - timedelta(days=30))
+
+    if filters.sort == 'oldest':
+        return query.order_by(CouponUsage.used_at.asc())
+    if filters.sort == 'discount_high':
+        return query.order_by(CouponUsage.discount_amount.desc())
+    if filters.sort == 'discount_low':
+        return query.order_by(CouponUsage.discount_amount.asc())
+    return query.order_by(CouponUsage.used_at.desc())
+
+
+def user_filters(args):
+    """User list filters from request args (role, status, q)"""
+    role = args.get('role', 'all')
+    status = args.get('status', 'all')
+    return UserFilters(
+        role=role if role in USER_ROLES else 'all',
+        status=status if status in ('active', 'inactive') else 'all',
+        search=args.get('q', '').strip()[:100]
+    )
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _starts_with(expression, prefix, postgresql):
+    """expression LIKE 'prefix%' in a form the dialect can answer from a btree index"""
+    if postgresql:
+        return expression.like(_escape_like(prefix) + '%', escape='\\')
+    # SQLite's LIKE is case-insensitive and skips the index; a range on the same expression uses it
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return db.and_(expression >= prefix, expression < upper)
+
+
+def user_search(term):
+    """Match username, full name and email by prefix (substring on PostgreSQL) and phone by digits"""
+    term = term.lower()
+    postgresql = db.session.get_bind().dialect.name == 'postgresql'
+    if postgresql and len(term) >= MIN_TRIGRAM_TERM:
+        # Same expression as ix_user_search_trgm
+        text = db.func.lower(db.func.coalesce(User.username, '') + ' ' +
+                             db.func.coalesce(User.full_name, '') + ' ' + User.email)
+        conditions = [text.like(f'%{_escape_like(term)}%', escape='\\')]
+    else:
+        conditions = [
+            _starts_with(db.func.lower(User.username), term, postgresql),
+            _starts_with(db.func.lower(User.full_name), term, postgresql),
+            _starts_with(db.func.lower(User.email), term, postgresql),
+        ]
+    if re.fullmatch(r'[\d\s+()-]+', term):
+        digits = normalize_phone(term)
+        if digits:
+            conditions.append(_starts_with(User.phone_digits, digits, postgresql))
+    return db.or_(*conditions)
+
+
+def filtered_users(filters):
+    """Apply UserFilters; each shape has a (filter, created_at, id) or search index"""
+    query = User.query
+    if filters.role != 'all':
+        query = query.filter(User.role == filters.role)
+    if filters.status != 'all':
+        query = query.filter(User.is_active == (filters.status == 'active'))
+    if filters.search:
+        query = query.filter(user_search(filters.search))
+    return query
@@ -36,7 +36,7 @@ db.init_app(app)
 # Create tables and initialize data within app context
 with app.app_context():
     # Import models to ensure tables are created
-    from models import User, MenuItem, CartItem, Order, OrderItem, StoreSettings, Promotion
+    from models import User, MenuItem, CartItem, CartSummary, Order, OrderItem, OrderNumberSequence, IdempotencyKey, OutboxMessage, OrderEvent, DailySales, StoreSettings, Promotion, CouponUsage, CouponDailyUsage
     
     # Create all tables
     db.create_all()
@@ -50,7 +50,8 @@ with app.app_context():
         print("Default store settings added")
         
     # Create admin user if not exists
-    if User.query.filter_by(role='admin').count() == 0:
+    # Id-only checks, so startup works before migrate_*.py has added newer user columns
+    if db.session.query(User.id).filter_by(role='admin').first() is None:
         admin_user = User(
             username='admin',
             email='admin@biryaniclub.com',
@@ -68,7 +69,7 @@ with app.app_context():
             print(f"Error creating admin user: {e}")
             
     # Create delivery person if not exists
-    if User.query.filter_by(role='delivery').count() == 0:
+    if db.session.query(User.id).filter_by(role='delivery').first() is None:
         delivery_user = User(
             username='delivery',
             email='delivery@biryaniclub.com',
@@ -323,7 +324,7 @@ with app.app_context():
             print("Complete menu items added")
             
             # Add sample promotions if none exist
-            if Promotion.query.count() == 0:
+            if db.session.query(Promotion.id).first() is None:
                 sample_promotions = [
                     Promotion(
                         code='WELCOME10',
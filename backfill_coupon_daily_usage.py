@@ -0,0 +1,45 @@
+
+from datetime import datetime
+from app import app, db
+from models import CouponUsage, CouponDailyUsage, DailySales
+
+def backfill_coupon_daily_usage():
+    """Rebuild the coupon_daily_usage aggregate from coupon_usage in one transaction"""
+    with app.app_context():
+        db.create_all()  # Creates coupon_daily_usage if this is its first run
+        if db.session.get_bind().dialect.name == 'postgresql':
+            # Hold off usage writes so the rebuilt totals match the table exactly
+            db.session.execute(db.text('LOCK TABLE coupon_usage IN SHARE MODE'))
+
+        day = db.func.date(CouponUsage.used_at)
+        per_day = db.session.query(
+            day, CouponUsage.coupon_code,
+            db.func.count(CouponUsage.id), db.func.coalesce(db.func.sum(CouponUsage.discount_amount), 0.0)
+        ).group_by(day, CouponUsage.coupon_code).all()
+
+        # Per-day totals, per-code totals and the grand total roll up from the per-day rows
+        totals = {}
+        for row_day, code, usage_count, discount_total in per_day:
+            if isinstance(row_day, str):
+                row_day = datetime.strptime(row_day, '%Y-%m-%d').date()
+            for key in ((row_day, code), (row_day, CouponDailyUsage.ALL_CODES),
+                        (DailySales.ALL_TIME, code), (DailySales.ALL_TIME, CouponDailyUsage.ALL_CODES)):
+                count_sum, discount_sum = totals.get(key, (0, 0.0))
+                totals[key] = (count_sum + usage_count, discount_sum + discount_total)
+
+        rows = [
+            {'day': row_day, 'coupon_code': code, 'usage_count': usage_count, 'discount_total': discount_total}
+            for (row_day, code), (usage_count, discount_total) in totals.items()
+        ]
+
+        CouponDailyUsage.query.delete()
+        if rows:
+            db.session.execute(db.insert(CouponDailyUsage), rows)
+        db.session.commit()
+
+        print(f"✓ Rebuilt coupon_daily_usage: {len(rows)} rows")
+
+if __name__ == "__main__":
+    print("Backfilling coupon usage aggregate...")
+    backfill_coupon_daily_usage()
+    print("\n✓ Backfill completed successfully!")
@@ -0,0 +1,49 @@
+
+from datetime import datetime
+from app import app, db
+from models import Order, DailySales
+
+def backfill_daily_sales():
+    """Rebuild the daily_sales rollup from the order table in one transaction"""
+    with app.app_context():
+        db.create_all()  # Creates daily_sales if this is its first run
+        if db.session.get_bind().dialect.name == 'postgresql':
+            # Hold off order writes so the rebuilt totals match the table exactly
+            db.session.execute(db.text('LOCK TABLE "order" IN SHARE MODE'))
+
+        status = db.func.coalesce(Order.status, 'pending')
+        revenue = db.func.coalesce(db.func.sum(db.case(
+            (Order.payment_status == 'confirmed', Order.total_amount), else_=0.0
+        )), 0.0)
+        discount = db.func.coalesce(db.func.sum(Order.discount), 0.0)
+
+        per_day = db.session.query(
+            db.func.date(Order.created_at), status, db.func.count(Order.id), revenue, discount
+        ).group_by(db.func.date(Order.created_at), status).all()
+        all_time = db.session.query(
+            status, db.func.count(Order.id), revenue, discount
+        ).group_by(status).all()
+
+        DailySales.query.delete()
+        rows = [
+            {'day': day if not isinstance(day, str) else datetime.strptime(day, '%Y-%m-%d').date(),
+             'status': row_status, 'order_count': order_count,
+             'confirmed_revenue': row_revenue, 'discount_total': row_discount}
+            for day, row_status, order_count, row_revenue, row_discount in per_day
+        ]
+        rows += [
+            {'day': DailySales.ALL_TIME, 'status': row_status, 'order_count': order_count,
+             'confirmed_revenue': row_revenue, 'discount_total': row_discount}
+            for row_status, order_count, row_revenue, row_discount in all_time
+        ]
+        if rows:
+            db.session.execute(db.insert(DailySales), rows)
+        db.session.commit()
+
+        print(f"✓ Rebuilt daily_sales: {len(per_day)} day/status rows from "
+              f"{sum(row[2] for row in per_day)} orders")
+
+if __name__ == "__main__":
+    print("Backfilling daily sales rollup...")
+    backfill_daily_sales()
+    print("\n✓ Backfill completed successfully!")
@@ -0,0 +1,90 @@
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Runs against its own database: it inserts up to a million synthetic orders
+os.environ['DATABASE_URL'] = os.environ.get('BENCHMARK_DATABASE_URL', 'sqlite:///benchmark_admin_orders.db')
+
+from sqlalchemy.orm import selectinload
+from app import app, db
+from models import Order, OrderItem, MenuItem
+from admin_queries import OrderFilters, filtered_orders, keyset_page
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+STATUSES = ('pending', 'confirmed', 'preparing', 'out_for_delivery', 'delivered', 'cancelled')
+CHUNK = 10_000
+REPEATS = 20
+
+def grow_to(target, start):
+    """Insert synthetic orders (one item each) until there are `target` of them"""
+    count = db.session.query(db.func.count(Order.id)).scalar()
+    menu_item_id = db.session.query(MenuItem.id).limit(1).scalar()
+    while count < target:
+        size = min(CHUNK, target - count)
+        orders = [
+            {
+                'order_number': f'BM{count + i:08d}',
+                'customer_name': 'Benchmark', 'customer_phone': '9876543210', 'customer_address': 'x',
+                'subtotal': 300.0, 'total_amount': 300.0, 'payment_method': 'cash',
+                'status': STATUSES[(count + i) % len(STATUSES)],
+                # One order a minute, oldest first
+                'created_at': start + timedelta(minutes=count + i)
+            }
+            for i in range(size)
+        ]
+        db.session.execute(db.insert(Order), orders)
+        first_id = db.session.query(db.func.max(Order.id)).scalar() - size + 1
+        db.session.execute(db.insert(OrderItem), [
+            {'order_id': order_id, 'menu_item_id': menu_item_id, 'quantity': 1, 'unit_price': 300.0, 'total_price': 300.0}
+            for order_id in range(first_id, first_id + size)
+        ])
+        db.session.commit()
+        count += size
+
+def time_page(filters, before=None, per_page=50):
+    """Median seconds to load one admin page (orders + items + menu items)"""
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        query = filtered_orders(filters).options(
+            selectinload(Order.order_items).selectinload(OrderItem.menu_item)
+        )
+        page = keyset_page(query, Order.created_at, Order.id, before=before, limit=per_page)
+        for order in page.rows:
+            [item.menu_item.name for item in order.order_items]
+        timings.append(time.perf_counter() - started)
+        db.session.expunge_all()
+    timings.sort()
+    return timings[len(timings) // 2], page
+
+def deep_cursor(filters, pages):
+    """Cursor of the page `pages` pages in, found by walking the list"""
+    cursor = None
+    for _ in range(pages):
+        page = keyset_page(filtered_orders(filters), Order.created_at, Order.id, before=cursor, limit=200)
+        if not page.older:
+            break
+        cursor = page.older
+    return cursor
+
+if __name__ == "__main__":
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1]
+    start = datetime(2024, 1, 1)
+    everything = OrderFilters('all', None, None)
+    pending = OrderFilters('pending', None, None)
+
+    with app.app_context():
+        db.create_all()
+        print(f"{'orders':>10} {'first page':>12} {'page ~100 deep':>15} {'pending only':>13} {'one week':>10}")
+        for size in (size for size in SIZES if size <= max_size):
+            grow_to(size, start)
+            last_day = (start + timedelta(minutes=size)).date()
+            one_week = OrderFilters('all', last_day - timedelta(days=6), last_day)
+            first, _ = time_page(everything)
+            deep, _ = time_page(everything, before=deep_cursor(everything, min(100, size // 400)))
+            by_status, _ = time_page(pending)
+            by_date, _ = time_page(one_week)
+            print(f"{size:>10,} {first * 1000:>10.2f}ms {deep * 1000:>13.2f}ms "
+                  f"{by_status * 1000:>11.2f}ms {by_date * 1000:>8.2f}ms")
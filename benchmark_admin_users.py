@@ -0,0 +1,77 @@
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Runs against its own database: it inserts up to half a million synthetic users
+os.environ['DATABASE_URL'] = os.environ.get('BENCHMARK_DATABASE_URL', 'sqlite:///benchmark_admin_users.db')
+
+from app import app, db
+from models import User, normalize_phone
+from admin_queries import UserFilters, filtered_users, keyset_page
+
+SIZES = (10_000, 100_000, 500_000)
+FIRST_NAMES = ('Aarav', 'Vivaan', 'Aditya', 'Ananya', 'Diya', 'Ishaan', 'Kavya', 'Rohan', 'Saanvi', 'Zara')
+LAST_NAMES = ('Sharma', 'Verma', 'Iyer', 'Reddy', 'Khan', 'Das', 'Nair', 'Gupta', 'Singh', 'Patel')
+ROLES = ('customer',) * 48 + ('delivery', 'admin')
+CHUNK = 10_000
+REPEATS = 20
+
+def grow_to(target, start):
+    """Insert synthetic users until there are `target` of them"""
+    count = db.session.query(db.func.count(User.id)).scalar()
+    while count < target:
+        size = min(CHUNK, target - count)
+        users = []
+        for n in range(count, count + size):
+            phone = f'+91 9{n:09d}'
+            users.append({
+                'username': f'user{n}', 'email': f'user{n}@example.com', 'password_hash': 'x',
+                'full_name': f'{FIRST_NAMES[n % 10]} {LAST_NAMES[n // 10 % 10]}',
+                'phone': phone, 'phone_digits': normalize_phone(phone),
+                'role': ROLES[n % len(ROLES)], 'is_active': n % 20 != 0,
+                'created_at': start + timedelta(minutes=n)
+            })
+        db.session.execute(db.insert(User), users)
+        db.session.commit()
+        count += size
+
+def time_page(filters, before=None):
+    """Median seconds to load one 50-user admin page"""
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        page = keyset_page(filtered_users(filters), User.created_at, User.id, before=before)
+        timings.append(time.perf_counter() - started)
+        db.session.expunge_all()
+    timings.sort()
+    return timings[len(timings) // 2], page
+
+if __name__ == "__main__":
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1]
+    start = datetime(2024, 1, 1)
+    cases = [
+        ('all users', UserFilters('all', 'all', '')),
+        ('delivery role', UserFilters('delivery', 'all', '')),
+        ('inactive', UserFilters('all', 'inactive', '')),
+        ('username', UserFilters('all', 'all', 'user4242')),
+        ('name prefix', UserFilters('all', 'all', 'kavya')),
+        ('email', UserFilters('all', 'all', 'user31337@')),
+        ('phone', UserFilters('all', 'all', '+91 90000 12')),
+        ('no match', UserFilters('all', 'all', 'nobody')),
+    ]
+
+    with app.app_context():
+        db.create_all()
+        print(f"{'users':>8} " + ' '.join(f'{name:>13}' for name, _ in cases) + f" {'page ~100 deep':>15}")
+        for size in (size for size in SIZES if size <= max_size):
+            grow_to(size, start)
+            timings = [time_page(filters)[0] for _, filters in cases]
+            cursor = None
+            for _ in range(min(100, size // 100)):
+                cursor = keyset_page(filtered_users(cases[0][1]), User.created_at, User.id,
+                                     before=cursor, limit=200).older
+            deep, _ = time_page(cases[0][1], before=cursor)
+            print(f"{size:>8,} " + ' '.join(f'{timing * 1000:>11.2f}ms' for timing in timings) +
+                  f" {deep * 1000:>13.2f}ms")
@@ -0,0 +1,35 @@
+
+import os
+import time
+
+# Runs against its own database: it commits thousands of order number allocations
+os.environ['DATABASE_URL'] = os.environ.get('BENCHMARK_DATABASE_URL', 'sqlite:///benchmark_order_numbers.db')
+
+from app import app, db
+from models import Order
+from order_numbers import format_order_number
+
+def benchmark_permutation(count=200000):
+    """Measure pure order number formatting throughput and check uniqueness"""
+    start = time.perf_counter()
+    numbers = {format_order_number(value) for value in range(1, count + 1)}
+    elapsed = time.perf_counter() - start
+    assert len(numbers) == count, "Duplicate order numbers generated"
+    print(f"Permutation: {count / elapsed:,.0f} numbers/sec ({elapsed * 1e6 / count:.2f} µs each), all unique")
+
+def benchmark_allocation(count=2000):
+    """Measure sequence-backed allocation throughput against the benchmark database"""
+    with app.app_context():
+        start = time.perf_counter()
+        numbers = []
+        for _ in range(count):
+            numbers.append(Order.generate_order_number())
+            db.session.commit()
+        elapsed = time.perf_counter() - start
+        assert len(set(numbers)) == count, "Duplicate order numbers allocated"
+        print(f"Allocation (one commit each): {count / elapsed:,.0f} numbers/sec, sample {numbers[:3]}")
+
+if __name__ == "__main__":
+    print("Benchmarking order number allocation...")
+    benchmark_permutation()
+    benchmark_allocation()
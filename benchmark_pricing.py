@@ -0,0 +1,151 @@
+
+import os
+import random
+import tempfile
+import time
+import pricing
+
+CATEGORIES = ['Biryani', 'Rolls', 'Curries', 'Bread', 'Beverages', 'Desserts']
+
+def random_cart(rng):
+    """A random cart of 1-12 lines"""
+    return [
+        pricing.CartLine(item_id, rng.randint(1, 10), float(rng.randint(20, 450)), rng.choice(CATEGORIES))
+        for item_id in rng.sample(range(1, 200), rng.randint(1, 12))
+    ]
+
+def random_terms(rng):
+    """Random promotion terms of any supported type, or None"""
+    discount_type = rng.choice(['percentage', 'fixed', 'free_item_category', None])
+    if discount_type is None:
+        return None
+    return pricing.PromotionTerms(
+        id=1, code='BENCH', discount_type=discount_type,
+        discount_value=float(rng.choice([5, 10, 25, 50, 100, 150])),
+        min_order_amount=float(rng.choice([0, 200, 500])),
+        max_discount=rng.choice([None, 50.0, 100.0]),
+        free_item_category=rng.choice(CATEGORIES),
+        free_item_qty=rng.randint(1, 3)
+    )
+
+def check_properties(runs=20000, seed=42):
+    """Randomized checks of the invariants every call site relies on"""
+    rng = random.Random(seed)
+    settings = pricing.PricingSettings(base_delivery_charge=30.0, free_delivery_threshold=250.0)
+    for _ in range(runs):
+        lines, terms = random_cart(rng), random_terms(rng)
+        quote = pricing.quote(lines, terms, settings)
+        assert quote.subtotal == sum(line.quantity * line.unit_price for line in lines)
+        assert abs(quote.total - (quote.subtotal + quote.delivery_charges - quote.discount)) < 1e-9
+        assert 0 <= quote.discount <= quote.subtotal
+        assert quote.delivery_charges == (0 if quote.subtotal >= 250 else 30)
+        if terms is None or quote.subtotal < terms.min_order_amount:
+            assert quote.discount == 0 and quote.discount_meta is None
+        if terms and terms.max_discount and terms.discount_type == 'percentage':
+            assert quote.discount <= terms.max_discount
+        # Line order must not change the price
+        assert pricing.quote(list(reversed(lines)), terms, settings) == quote
+    print(f"Properties: {runs} random carts passed")
+
+def check_call_sites(runs=150, seed=11):
+    """Randomized carts and coupons through the real cart, checkout and coupon routes must agree
+
+    Each run fills a new customer's cart through /api/cart, then compares the cart page,
+    /api/cart, the checkout page, /api/validate_coupon and the Order that checkout stores.
+    """
+    # A throwaway database, so the app is only imported (and set up) for this check
+    os.environ['DATABASE_URL'] = os.environ.get(
+        'BENCHMARK_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark_pricing.db'))
+    from flask import template_rendered
+    from app import app, db
+    from models import MenuItem, Order, Promotion
+    from promotion_catalog import invalidate_promotion_catalog
+
+    rendered = {}
+    template_rendered.connect(lambda sender, template, context, **extra: rendered.update({template.name: context}),
+                              app, weak=False)
+
+    def same(*amounts):
+        return max(amounts) - min(amounts) < 0.005
+
+    rng = random.Random(seed)
+    with app.app_context():
+        menu = [(item.id, item.category) for item in MenuItem.query.filter_by(in_stock=True).order_by(MenuItem.id)]
+    placed = refused = 0
+    for run in range(runs):
+        lines = rng.sample(menu, rng.randint(1, 5))
+        terms = random_terms(rng)
+        code = ''
+        if terms:
+            code = f'PRICECHECK{run}'
+            with app.app_context():
+                db.session.add(Promotion(
+                    code=code, discount_type=terms.discount_type, discount_value=terms.discount_value,
+                    min_order_amount=terms.min_order_amount, max_discount=terms.max_discount,
+                    free_item_category=rng.choice([category for _, category in lines] + [terms.free_item_category]),
+                    free_item_qty=terms.free_item_qty, is_active=True
+                ))
+                db.session.commit()
+                invalidate_promotion_catalog()
+
+        client = app.test_client()
+        name = f'pricecheck{run}'
+        client.post('/register', data={'username': name, 'email': f'{name}@bench.test', 'password': 'bench123',
+                                       'confirm_password': 'bench123', 'full_name': name, 'phone': ''})
+        client.post('/login', data={'username': name, 'password': 'bench123'})
+        api_cart = client.post('/api/cart', json={'operations': [
+            {'item_id': item_id, 'quantity': rng.randint(1, 4), 'mode': 'set'} for item_id, _ in lines
+        ]}).get_json()['cart']
+
+        client.get('/cart')
+        cart_page = rendered.pop('cart.html')
+        assert client.get(f'/checkout?coupon={code}').status_code == 200, f"Run {run}: checkout page redirected"
+        page = rendered.pop('checkout.html')
+        validated = client.post('/api/validate_coupon', json={'coupon_code': code, 'subtotal': 0}).get_json()
+
+        assert same(api_cart['subtotal'], cart_page['subtotal'], page['subtotal']), f"Run {run}: subtotals differ"
+        assert same(api_cart['delivery_charges'], cart_page['delivery_charges'], page['delivery_charges']), \
+            f"Run {run}: delivery differs"
+        assert same(api_cart['total'], cart_page['total'], page['total'] + page['discount']), \
+            f"Run {run}: cart totals differ"
+        if validated['valid']:
+            assert same(validated['discount'], page['discount']), f"Run {run}: discounts differ"
+            assert same(validated['delivery_charges'], page['delivery_charges']), f"Run {run}: delivery differs"
+            assert same(validated['new_total'], page['total']), f"Run {run}: totals differ"
+        elif code:
+            assert page['discount'] == 0, f"Run {run}: checkout page discounts a coupon validation refuses"
+
+        response = client.post('/checkout', data={'customer_name': 'Price Check', 'customer_phone': '9876543210',
+                                                   'customer_address': 'Bench lane', 'payment_method': 'cash',
+                                                   'coupon_code': code})
+        if '/order_confirmation/' not in response.location:
+            # Below the minimum order, or a coupon that does not apply; validation must agree
+            assert page['subtotal'] < 200 or (code and not validated['valid']), f"Run {run}: checkout refused"
+            refused += 1
+            continue
+        assert not code or validated['valid'], f"Run {run}: checkout took a coupon validation refuses"
+        with app.app_context():
+            order = db.session.get(Order, int(response.location.rsplit('/', 1)[1]))
+            assert same(order.subtotal, page['subtotal']), f"Run {run}: order subtotal differs"
+            assert same(order.delivery_charges, page['delivery_charges']), f"Run {run}: order delivery differs"
+            assert same(order.discount, page['discount']), f"Run {run}: order discount differs"
+            assert same(order.total_amount, page['total']), f"Run {run}: order total differs"
+        placed += 1
+    print(f"Call sites: {runs} random carts agree across cart, checkout, validate_coupon and the order "
+          f"({placed} placed, {refused} refused)")
+
+def benchmark_quote(runs=100000, seed=7):
+    """Measure quotes per second on pre-generated carts"""
+    rng = random.Random(seed)
+    cases = [(random_cart(rng), random_terms(rng)) for _ in range(1000)]
+    start = time.perf_counter()
+    for i in range(runs):
+        lines, terms = cases[i % len(cases)]
+        pricing.quote(lines, terms)
+    elapsed = time.perf_counter() - start
+    print(f"Quote: {runs / elapsed:,.0f} quotes/sec ({elapsed * 1e6 / runs:.2f} µs each)")
+
+if __name__ == "__main__":
+    check_properties()
+    benchmark_quote()
+    check_call_sites()
@@ -0,0 +1,58 @@
+import os
+import re
+import uuid
+
+# Runs against its own database: it registers a customer and fills a cart
+os.environ['DATABASE_URL'] = os.environ.get('BENCHMARK_DATABASE_URL', 'sqlite:///benchmark_request_queries.db')
+
+from sqlalchemy import event
+from app import app, db
+from models import MenuItem, StoreSettings
+
+PAGES = ('/', '/menu', '/cart', '/checkout')
+# Lookups memoized per request by utils.py; each may hit the database at most once
+MEMOIZED = {
+    'user': re.compile(r'\bFROM "?user"?\s'),
+    'store_settings': re.compile(r'\bFROM store_settings\b'),
+    'cart_item': re.compile(r'\bFROM cart_item\b'),
+    'cart_summary': re.compile(r'\bFROM cart_summary\b'),
+}
+
+def logged_in_client_with_cart():
+    name = f'queries_{uuid.uuid4().hex[:6]}'
+    client = app.test_client()
+    client.post('/register', data={'username': name, 'email': f'{name}@bench.test', 'password': 'bench123',
+                                   'confirm_password': 'bench123', 'full_name': name, 'phone': ''})
+    client.post('/login', data={'username': name, 'password': 'bench123'})
+    with app.app_context():
+        item_ids = [item_id for item_id, in db.session.query(MenuItem.id).filter_by(in_stock=True).limit(3)]
+    for item_id in item_ids:
+        client.post('/add_to_cart', data={'item_id': item_id, 'quantity': 2})
+    return client
+
+def check_request_queries():
+    """Render typical pages for a logged-in customer and count the statements each one runs"""
+    client = logged_in_client_with_cart()
+    for page in PAGES:
+        client.get(page)  # Warm the per-worker menu, promotion and settings snapshots
+
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+    for page in PAGES:
+        StoreSettings.invalidate_cache()  # So the store status lookup reaches the database
+        statements.clear()
+        status = client.get(page).status_code
+        counts = {name: sum(1 for statement in statements if pattern.search(statement))
+                  for name, pattern in MEMOIZED.items()}
+        print(f"{page}: {status}, {len(statements)} statements "
+              f"({', '.join(f'{name} {count}' for name, count in counts.items())})")
+        assert status == 200, f"{page} returned {status}"
+        for name, count in counts.items():
+            assert count <= 1, f"{page} looked up {name} {count} times"
+    print("✓ User, store status and cart are each loaded at most once per request")
+
+if __name__ == "__main__":
+    print("Counting queries per request...")
+    check_request_queries()
@@ -0,0 +1,193 @@
+import io
+import re
+import secrets
+import time
+from collections import namedtuple
+
+from sqlalchemy import column, literal, select, table
+from sqlalchemy.dialects import postgresql
+
+from models import db, Promotion, upsert_insert, ist_now
+
+# No 0/O or 1/I/L, so codes survive being read out over the phone
+CODE_ALPHABET = '23456789ABCDEFGHJKMNPQRSTUVWXYZ'
+CODE_MAX_LENGTH = Promotion.__table__.c.code.type.length
+DEFAULT_CODE_LENGTH = 8
+MAX_CAMPAIGN_SIZE = 500_000
+SQLITE_CHUNK_SIZE = 5_000
+# Rounds of regenerating codes that collided with existing ones
+MAX_FILL_ROUNDS = 5
+
+_PREFIX_PATTERN = re.compile(r'^[A-Z0-9]*$')
+_CAMPAIGN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,40}$')
+
+# Random bytes map onto the alphabet; the top bytes are dropped so every
+# character is equally likely (248 = 8 * 31)
+_BYTE_LIMIT = 256 - 256 % len(CODE_ALPHABET)
+_BYTE_TO_CHAR = bytes(ord(CODE_ALPHABET[b % len(CODE_ALPHABET)]) for b in range(256))
+_REJECTED_BYTES = bytes(range(_BYTE_LIMIT, 256))
+
+
+class BulkResult(namedtuple('BulkResult', ['campaign', 'requested', 'created', 'seconds'])):
+    __slots__ = ()
+
+    @property
+    def codes_per_second(self):
+        return self.created / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f'{self.created:,} codes for campaign {self.campaign} in {self.seconds:.2f}s '
+                f'({self.codes_per_second:,.0f} codes/s)')
+
+
+def _random_chars(count):
+    chars = b''
+    while len(chars) < count:
+        needed = count - len(chars)
+        chars += secrets.token_bytes(needed + needed // 16 + 16).translate(_BYTE_TO_CHAR, _REJECTED_BYTES)
+    return chars[:count].decode()
+
+
+def generate_codes(count, prefix='', length=DEFAULT_CODE_LENGTH):
+    """count distinct random codes of the form PREFIX + length alphabet characters"""
+    chars = _random_chars(count * length)
+    codes = {prefix + chars[i:i + length] for i in range(0, len(chars), length)}
+    while len(codes) < count:  # Birthday collisions inside the batch
+        codes.add(prefix + _random_chars(length))
+    return list(codes)
+
+
+def validate_campaign(campaign, count, prefix, length):
+    """Error message for bad campaign parameters, or None"""
+    if not _CAMPAIGN_PATTERN.match(campaign or ''):
+        return 'Campaign name must be 1-40 letters, digits, dashes or underscores'
+    if not 1 <= count <= MAX_CAMPAIGN_SIZE:
+        return f'Number of codes must be between 1 and {MAX_CAMPAIGN_SIZE:,}'
+    if not _PREFIX_PATTERN.match(prefix):
+        return 'Prefix may only contain letters and numbers'
+    if length < 6:
+        return 'Random part must be at least 6 characters'
+    if len(prefix) + length > CODE_MAX_LENGTH:
+        return f'Prefix plus random part must fit in {CODE_MAX_LENGTH} characters'
+    # Keep the code space at least 10^4 times larger than the campaign
+    if len(CODE_ALPHABET) ** length < count * 10_000:
+        return 'Random part is too short for that many codes'
+    return None
+
+
+def _copy_codes(codes, values):
+    """PostgreSQL: COPY the codes into a temp table, then one INSERT ... SELECT"""
+    connection = db.session.connection()
+    connection.execute(db.text(
+        'CREATE TEMP TABLE IF NOT EXISTS promotion_import (code varchar(20) NOT NULL) ON COMMIT DROP'
+    ))
+    connection.execute(db.text('TRUNCATE promotion_import'))
+    cursor = connection.connection.cursor()
+    cursor.copy_expert('COPY promotion_import (code) FROM STDIN', io.StringIO('\n'.join(codes) + '\n'))
+
+    imported = table('promotion_import', column('code'))
+    columns = ['code'] + list(values)
+    connection.execute(
+        postgresql.insert(Promotion)
+        .from_select(columns, select(imported.c.code, *(literal(value) for value in values.values())))
+        .on_conflict_do_nothing(index_elements=['code'])
+    )
+
+
+def _insert_codes(codes, values):
+    """SQLite: chunked executemany of one precompiled INSERT, skipping codes that already exist"""
+    connection = db.session.connection()
+    dialect = connection.dialect
+    statement = upsert_insert(Promotion)\
+        .values({name: db.bindparam(name) for name in ['code', *values]})\
+        .on_conflict_do_nothing(index_elements=['code'])\
+        .compile(dialect=dialect)
+    # Every row shares the campaign terms, so they go through the type processors once
+    shared = {}
+    for name, value in values.items():
+        process = Promotion.__table__.c[name].type.bind_processor(dialect)
+        shared[name] = process(value) if process and value is not None else value
+    template = [shared.get(name) for name in statement.positiontup]
+    code_index = statement.positiontup.index('code')
+
+    sql = str(statement)
+    for start in range(0, len(codes), SQLITE_CHUNK_SIZE):
+        rows = []
+        for code in codes[start:start + SQLITE_CHUNK_SIZE]:
+            template[code_index] = code
+            rows.append(tuple(template))
+        connection.exec_driver_sql(sql, rows)
+
+
+def _campaign_size(campaign):
+    return db.session.query(db.func.count(Promotion.id)).filter(Promotion.campaign == campaign).scalar()
+
+
+def create_campaign(campaign, count, prefix='', length=DEFAULT_CODE_LENGTH, description='',
+                    discount_type='fixed', discount_value=0, min_order_amount=0, max_discount=None,
+                    expires_at=None, free_item_category=None, free_item_qty=None):
+    """Create `count` single-use promotions for a campaign in one transaction; returns a BulkResult"""
+    prefix = (prefix or '').upper().strip()
+    error = validate_campaign(campaign, count, prefix, length)
+    if error:
+        raise ValueError(error)
+
+    values = {
+        'description': description or f'{campaign} campaign code',
+        'discount_type': discount_type,
+        'discount_value': discount_value,
+        'min_order_amount': min_order_amount,
+        'max_discount': max_discount,
+        'usage_limit': 1,
+        'used_count': 0,
+        'is_active': True,
+        'created_at': ist_now(),
+        'expires_at': expires_at,
+        'free_item_category': free_item_category,
+        'free_item_qty': free_item_qty,
+        'campaign': campaign,
+    }
+    load = _copy_codes if db.session.get_bind().dialect.name == 'postgresql' else _insert_codes
+
+    started = time.perf_counter()
+    try:
+        existing = _campaign_size(campaign)
+        created = 0
+        for _ in range(MAX_FILL_ROUNDS):
+            load(generate_codes(count - created, prefix, length), values)
+            created = _campaign_size(campaign) - existing
+            if created >= count:
+                break
+        else:
+            raise RuntimeError(f'Only {created} of {count} codes were unique; use a longer random part')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return BulkResult(campaign, count, created, time.perf_counter() - started)
+
+
+def campaign_summaries():
+    """(campaign, codes, redeemed, created_at) for every bulk campaign, newest first"""
+    return db.session.query(
+        Promotion.campaign,
+        db.func.count(Promotion.id),
+        db.func.coalesce(db.func.sum(Promotion.used_count), 0),
+        db.func.min(Promotion.created_at)
+    ).filter(Promotion.campaign.isnot(None))\
+     .group_by(Promotion.campaign)\
+     .order_by(db.func.min(Promotion.created_at).desc()).all()
+
+
+def campaign_codes(campaign, batch_size=10_000):
+    """Yield (code, used_count, expires_at) for a campaign without loading it all at once"""
+    last_id = 0
+    while True:
+        rows = db.session.query(Promotion.id, Promotion.code, Promotion.used_count, Promotion.expires_at)\
+                         .filter(Promotion.campaign == campaign, Promotion.id > last_id)\
+                         .order_by(Promotion.id).limit(batch_size).all()
+        if not rows:
+            return
+        for row in rows:
+            yield row.code, row.used_count or 0, row.expires_at
+        last_id = rows[-1].id
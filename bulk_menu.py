@@ -0,0 +1,145 @@
+import math
+from collections import namedtuple
+
+from models import db, MenuItem
+from menu_catalog import invalidate_menu_catalog
+
+PRICE_MODES = ('percent', 'fixed')
+# none: paise precision; whole: up to the next rupee; psychological: up to a price ending in 9
+ROUNDING_MODES = ('none', 'whole', 'psychological')
+MIN_PSYCHOLOGICAL_PRICE = 29
+MAX_PERCENT_CHANGE = 100
+
+# One changed field of one item; old and new are the column values
+MenuChange = namedtuple('MenuChange', ['item_id', 'name', 'field', 'old', 'new'])
+
+
+class BulkMenuResult(namedtuple('BulkMenuResult', ['matched', 'changes', 'applied'])):
+    __slots__ = ()
+
+    @property
+    def changed_items(self):
+        return len({change.item_id for change in self.changes})
+
+    def to_dict(self):
+        return {
+            'matched': self.matched,
+            'changed_items': self.changed_items,
+            'applied': self.applied,
+            'changes': [change._asdict() for change in self.changes],
+        }
+
+    def __str__(self):
+        verb = 'Updated' if self.applied else 'Would update'
+        return f'{verb} {self.changed_items} of {self.matched} items ({len(self.changes)} field changes)'
+
+
+def psychological_price(price, minimum=MIN_PSYCHOLOGICAL_PRICE):
+    """Round up to the nearest price ending in 9 (from ₹50) or in 4/9 (below ₹50)"""
+    step = 10 if price >= 50 else 5
+    return max(math.ceil((price + 1) / step) * step - 1, minimum)
+
+
+def round_price(price, rounding='none'):
+    # Paise first, so float noise (200 * 1.1 = 220.00000000000003) does not round up a rupee
+    price = round(price, 2)
+    if rounding == 'whole':
+        return float(math.ceil(price))
+    if rounding == 'psychological':
+        return float(psychological_price(price))
+    return price
+
+
+def changed_price(price, mode, value, rounding='none'):
+    """New price after a percent or fixed (rupee) change and rounding"""
+    if mode == 'percent':
+        price = price * (1 + value / 100)
+    elif mode == 'fixed':
+        price = price + value
+    return round_price(price, rounding)
+
+
+def validate_operation(price_mode=None, price_value=0, rounding='none', in_stock=None, category=None):
+    """Error message for a bad bulk operation, or None"""
+    if price_mode is not None and price_mode not in PRICE_MODES:
+        return f'Price change must be one of: {", ".join(PRICE_MODES)}'
+    if rounding not in ROUNDING_MODES:
+        return f'Rounding must be one of: {", ".join(ROUNDING_MODES)}'
+    if price_mode == 'percent' and not -MAX_PERCENT_CHANGE < price_value <= MAX_PERCENT_CHANGE:
+        return f'Percentage change must be above -{MAX_PERCENT_CHANGE}% and at most {MAX_PERCENT_CHANGE}%'
+    if category is not None and not 0 < len(category) <= MenuItem.__table__.c.category.type.length:
+        return 'Category name is empty or too long'
+    if price_mode is None and rounding == 'none' and in_stock is None and category is None:
+        return 'Nothing to change'
+    return None
+
+
+def parse_item_ids(item_ids):
+    try:
+        return sorted({int(item_id) for item_id in item_ids})
+    except (TypeError, ValueError):
+        raise ValueError('Item ids must be whole numbers')
+
+
+def bulk_update_menu(item_ids, price_mode=None, price_value=0, rounding='none', in_stock=None,
+                     category=None, dry_run=False):
+    """Apply price, stock and category changes to menu items with one UPDATE in one transaction
+
+    Rows are read once (locked on PostgreSQL) to build the diff; the UPDATE writes exactly
+    that diff, with per-item prices in a CASE on id. dry_run returns the diff untouched.
+    """
+    item_ids = parse_item_ids(item_ids)
+    category = category.strip() if category else None
+    if rounding != 'none' and price_mode is None:
+        price_mode, price_value = 'fixed', 0  # Rounding existing prices only
+    error = validate_operation(price_mode, price_value, rounding, in_stock, category)
+    if error:
+        raise ValueError(error)
+    if not item_ids:
+        raise ValueError('No items selected')
+
+    try:
+        query = db.session.query(MenuItem.id, MenuItem.name, MenuItem.price, MenuItem.in_stock, MenuItem.category)\
+                          .filter(MenuItem.id.in_(item_ids)).order_by(MenuItem.category, MenuItem.name)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            query = query.with_for_update()
+        rows = query.all()
+
+        changes = []
+        prices = {}
+        for row in rows:
+            if price_mode is not None:
+                price = changed_price(row.price, price_mode, price_value, rounding)
+                if price <= 0:
+                    raise ValueError(f'{row.name} would cost ₹{price:g}')
+                if price != row.price:
+                    prices[row.id] = price
+                    changes.append(MenuChange(row.id, row.name, 'price', row.price, price))
+            if in_stock is not None and bool(row.in_stock) != in_stock:
+                changes.append(MenuChange(row.id, row.name, 'in_stock', bool(row.in_stock), in_stock))
+            if category is not None and row.category != category:
+                changes.append(MenuChange(row.id, row.name, 'category', row.category, category))
+
+        changed_ids = sorted({change.item_id for change in changes})
+        if dry_run or not changed_ids:
+            db.session.rollback()
+            return BulkMenuResult(len(rows), changes, applied=False)
+
+        values = {}
+        if prices:
+            values['price'] = db.case(prices, value=MenuItem.id, else_=MenuItem.price)
+        if in_stock is not None:
+            values['in_stock'] = in_stock
+        if category is not None:
+            values['category'] = category
+        db.session.execute(
+            db.update(MenuItem).where(MenuItem.id.in_(changed_ids)).values(values),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    invalidate_menu_catalog()
+    return BulkMenuResult(len(rows), changes, applied=True)
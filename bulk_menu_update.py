@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Bulk menu changes as one UPDATE in one transaction
+
+    python bulk_menu_update.py --all --percent 15 --round psychological --dry-run
+    python bulk_menu_update.py --category Starters --add -10
+    python bulk_menu_update.py --ids 4,5,6 --out-of-stock --move-to "Chef Specials"
+"""
+
+import argparse
+
+from app import app, db
+from models import MenuItem
+from bulk_menu import bulk_update_menu, ROUNDING_MODES
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Change prices, stock and category of many menu items at once')
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument('--ids', help='Comma-separated menu item ids')
+    selection.add_argument('--category', help='Every item in this category')
+    selection.add_argument('--all', action='store_true', help='Every menu item')
+
+    price = parser.add_mutually_exclusive_group()
+    price.add_argument('--percent', type=float, help='Change prices by this percentage (negative lowers them)')
+    price.add_argument('--add', type=float, help='Change prices by this many rupees (negative lowers them)')
+    parser.add_argument('--round', dest='rounding', default='none', choices=ROUNDING_MODES)
+
+    stock = parser.add_mutually_exclusive_group()
+    stock.add_argument('--in-stock', dest='in_stock', action='store_const', const=True)
+    stock.add_argument('--out-of-stock', dest='in_stock', action='store_const', const=False)
+    parser.add_argument('--move-to', help='Move the items to this category')
+    parser.add_argument('--dry-run', action='store_true', help='Show the changes without saving them')
+    return parser.parse_args()
+
+def selected_ids(args):
+    if args.ids:
+        return args.ids.split(',')
+    query = db.session.query(MenuItem.id)
+    if args.category:
+        query = query.filter(MenuItem.category == args.category)
+    return [item_id for (item_id,) in query.all()]
+
+def format_value(field, value):
+    if field == 'price':
+        return f'₹{value:.2f}'
+    if field == 'in_stock':
+        return 'in stock' if value else 'out of stock'
+    return value
+
+if __name__ == '__main__':
+    args = parse_args()
+    price_mode = 'percent' if args.percent is not None else 'fixed' if args.add is not None else None
+    price_value = args.percent if args.percent is not None else args.add or 0
+
+    with app.app_context():
+        try:
+            result = bulk_update_menu(
+                selected_ids(args), price_mode=price_mode, price_value=price_value, rounding=args.rounding,
+                in_stock=args.in_stock, category=args.move_to, dry_run=args.dry_run
+            )
+        except ValueError as e:
+            raise SystemExit(f"❌ {e}")
+
+        print(f"{'Item Name':<40} {'Field':<10} {'Old':>14} {'New':>14}")
+        print("-" * 81)
+        for change in result.changes:
+            print(f"{change.name:<40} {change.field:<10} "
+                  f"{format_value(change.field, change.old):>14} {format_value(change.field, change.new):>14}")
+        print(f"\n{'🔍' if args.dry_run else '✅'} {result}")
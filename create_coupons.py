@@ -1,6 +1,7 @@
 
 from app import app, db
 from models import Promotion
+from promotion_catalog import invalidate_promotion_catalog
 from datetime import datetime, timedelta
 import pytz
 
@@ -10,9 +11,13 @@ def create_welcome_coupons():
     with app.app_context():
         ist = pytz.timezone('Asia/Kolkata')
         
+        # Codes that already exist, in one query
+        order_codes = [f'ORDER10_{order_num}' for order_num in range(2, 6)]
+        existing_codes = {code for (code,) in db.session.query(Promotion.code)
+                          .filter(Promotion.code.in_(['WELCOME20'] + order_codes))}
+        
         # Check if WELCOME20 exists
-        welcome20 = Promotion.query.filter_by(code='WELCOME20').first()
-        if not welcome20:
+        if 'WELCOME20' not in existing_codes:
             welcome20 = Promotion(
                 code='WELCOME20',
                 description='Welcome offer - 20% off on first order',
@@ -32,9 +37,8 @@ def create_welcome_coupons():
         # Generate ORDER10_X coupons for orders 2-5
         for order_num in range(2, 6):
             code = f'ORDER10_{order_num}'
-            existing = Promotion.query.filter_by(code=code).first()
             
-            if not existing:
+            if code not in existing_codes:
                 promo = Promotion(
                     code=code,
                     description=f'10% off on order #{order_num}',
@@ -52,12 +56,13 @@ def create_welcome_coupons():
                 print(f"✓ {code} already exists")
         
         db.session.commit()
+        invalidate_promotion_catalog()
         print("\n✅ All coupons created successfully!")
         
         # Display all active coupons
         print("\n📋 Active Coupons:")
         print("-" * 60)
-        all_promos = Promotion.query.filter_by(is_active=True).all()
+        all_promos = Promotion.query.filter_by(is_active=True, campaign=None).all()
         for p in all_promos:
             print(f"Code: {p.code:15} | {p.discount_value}% off | Min: ₹{p.min_order_amount}")
         print("-" * 60)
@@ -5,6 +5,7 @@ Create promotional coupons for Biryani Club
 
 from app import app, db
 from models import Promotion
+from promotion_catalog import invalidate_promotion_catalog
 from datetime import datetime, timedelta
 import pytz
 
@@ -15,11 +16,10 @@ def create_promotional_coupons():
         
         # Delete existing promotional coupons if they exist
         existing_codes = ['WELCOME20', 'FIRST10', 'ORDER2', 'ORDER3', 'ORDER4', 'ORDER5']
-        for code in existing_codes:
-            existing = Promotion.query.filter_by(code=code).first()
-            if existing:
-                db.session.delete(existing)
-                print(f"Deleted existing coupon: {code}")
+        existing = Promotion.query.filter(Promotion.code.in_(existing_codes)).all()
+        for promotion in existing:
+            db.session.delete(promotion)
+            print(f"Deleted existing coupon: {promotion.code}")
         
         db.session.commit()
         
@@ -101,6 +101,7 @@ def create_promotional_coupons():
         print("✓ Created SWEETTOOTH coupon: Free dessert with orders above ₹250")
         
         db.session.commit()
+        invalidate_promotion_catalog()
         print("\n✅ All promotional coupons created successfully!")
         print("\n📋 Coupon Summary:")
         print("   • WELCOME20: Perfect for new customers - 20% off first order")
@@ -3,6 +3,7 @@
 
 from app import app, db
 from models import Promotion
+from promotion_catalog import invalidate_promotion_catalog
 from datetime import datetime, timedelta
 import pytz
 
@@ -12,9 +13,12 @@ def ist_now():
     return datetime.now(ist).replace(tzinfo=None)
 
 with app.app_context():
+    order_codes = ['2ND10', '3RD10', '4TH10', '5TH10']
+    existing_codes = {code for (code,) in db.session.query(Promotion.code)
+                      .filter(Promotion.code.in_(['WELCOME20'] + order_codes))}
+    
     # Create WELCOME20 promotion (20% off, first-time users)
-    welcome20 = Promotion.query.filter_by(code='WELCOME20').first()
-    if not welcome20:
+    if 'WELCOME20' not in existing_codes:
         welcome20 = Promotion(
             code='WELCOME20',
             description='Welcome offer - 20% discount on your first order',
@@ -56,8 +60,7 @@ with app.app_context():
     ]
     
     for coupon_data in order_coupons:
-        existing = Promotion.query.filter_by(code=coupon_data['code']).first()
-        if not existing:
+        if coupon_data['code'] not in existing_codes:
             coupon = Promotion(
                 code=coupon_data['code'],
                 description=coupon_data['description'],
@@ -76,9 +79,10 @@ with app.app_context():
     
     # Commit all changes
     db.session.commit()
+    invalidate_promotion_catalog()
     
     print("\n🎉 All welcome and order-based coupons are ready!")
     print("\nActive Promotions:")
-    promotions = Promotion.query.filter_by(is_active=True).all()
+    promotions = Promotion.query.filter_by(is_active=True, campaign=None).all()
     for promo in promotions:
         print(f"  • {promo.code}: {promo.description}")
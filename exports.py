@@ -0,0 +1,211 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from flask import Response, stream_with_context
+
+from models import Order, OrderItem, MenuItem, CouponUsage, User, ist_now
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+# Rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 1_000
+# Rows buffered before a chunk is sent to the client
+FLUSH_EVERY = 500
+# Leading characters that make Excel treat a cell as a formula
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+ORDER_COLUMNS = [
+    ('order_number', Order.order_number), ('created_at', Order.created_at), ('status', Order.status),
+    ('customer_name', Order.customer_name), ('customer_phone', Order.customer_phone),
+    ('customer_address', Order.customer_address), ('payment_method', Order.payment_method),
+    ('payment_status', Order.payment_status), ('coupon_code', Order.coupon_code),
+    ('subtotal', Order.subtotal), ('delivery_charges', Order.delivery_charges), ('discount', Order.discount),
+    ('total_amount', Order.total_amount), ('item', MenuItem.name), ('quantity', OrderItem.quantity),
+    ('unit_price', OrderItem.unit_price), ('line_total', OrderItem.total_price),
+]
+
+COUPON_USAGE_COLUMNS = [
+    ('used_at', CouponUsage.used_at), ('coupon_code', CouponUsage.coupon_code),
+    ('order_number', CouponUsage.order_number), ('username', CouponUsage.username),
+    ('user_email', CouponUsage.user_email), ('guest_name', CouponUsage.guest_name),
+    ('guest_phone', CouponUsage.guest_phone), ('guest_email', CouponUsage.guest_email),
+    ('order_subtotal', CouponUsage.order_subtotal), ('discount_amount', CouponUsage.discount_amount),
+    ('discount_type', CouponUsage.discount_type),
+]
+
+USER_COLUMNS = [
+    ('id', User.id), ('username', User.username), ('full_name', User.full_name), ('email', User.email),
+    ('phone', User.phone), ('role', User.role), ('is_active', User.is_active),
+    ('loyalty_points', User.loyalty_points), ('loyalty_tier', User.loyalty_tier), ('created_at', User.created_at),
+]
+
+
+def order_line_rows(query):
+    """One row per order line (orders without items get one row), newest order first
+
+    query is an already filtered Order query; the lines come from the same statement
+    so the export is a single streamed SELECT.
+    """
+    return query.outerjoin(OrderItem, OrderItem.order_id == Order.id)\
+                .outerjoin(MenuItem, MenuItem.id == OrderItem.menu_item_id)\
+                .with_entities(*(column for _, column in ORDER_COLUMNS))\
+                .order_by(Order.created_at.desc(), Order.id.desc(), OrderItem.id)
+
+
+def column_rows(query, columns):
+    """Plain tuples for the export columns, keeping the query's filters and ordering"""
+    return query.with_entities(*(column for _, column in columns))
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value  # Customer-entered text must not run as a spreadsheet formula
+    return value
+
+
+def _drain(buffer):
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
+
+
+def _csv_chunks(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield _drain(buffer)  # Header goes out before the query runs
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_cell_text(value) for value in row])
+        if count % FLUSH_EVERY == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+class _ChunkSink:
+    """Write-only file object for zipfile; zipfile falls back to data descriptors without tell()"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+# Characters XML 1.0 does not allow, even escaped
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if value is None:
+            cells.append('<c/>')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c t="n"><v>{value}</v></c>')
+        else:
+            if isinstance(value, bool):
+                value = 'yes' if value else 'no'
+            text = escape(_INVALID_XML.sub('', str(_cell_text(value))))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+
+def _xlsx_chunks(sheet_name, header, rows):
+    """A one-sheet workbook written straight into a deflate stream, so nothing is held but the current chunk"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in _XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        workbook.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        yield sink.drain()
+
+        # Size is unknown up front, so the sheet is always written with zip64 headers
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(header).encode())
+            for count, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row(row).encode())
+                if count % FLUSH_EVERY == 0:
+                    yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+def export_response(query, columns, filename, fmt):
+    """Stream query's rows as CSV or XLSX through a server-side cursor
+
+    The response is chunked: the header goes out before the first fetch and memory
+    stays at one fetch batch plus one output chunk however many rows there are.
+    """
+    header = [name for name, _ in columns]
+    rows = query.yield_per(FETCH_SIZE)
+    stamp = ist_now().strftime('%Y%m%d-%H%M')
+    if fmt == 'xlsx':
+        body = _xlsx_chunks(filename, header, rows)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        body = _csv_chunks(header, rows)
+        mimetype = 'text/csv'
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}-{stamp}.{fmt}',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Generate a campaign of single-use coupon codes
+
+    python generate_coupons.py DIWALI24 100000 --prefix DW --type fixed --value 50 --min-order 300
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime
+
+from app import app, db
+from models import Promotion
+from bulk_coupons import create_campaign, DEFAULT_CODE_LENGTH
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate single-use coupon codes for a campaign')
+    parser.add_argument('campaign', help='Campaign name (letters, digits, - and _)')
+    parser.add_argument('count', type=int, help='Number of codes to create')
+    parser.add_argument('--prefix', default='', help='Fixed start of every code')
+    parser.add_argument('--length', type=int, default=DEFAULT_CODE_LENGTH, help='Random characters per code')
+    parser.add_argument('--type', dest='discount_type', default='fixed',
+                        choices=['percentage', 'fixed', 'free_item_category'])
+    parser.add_argument('--value', dest='discount_value', type=float, default=0)
+    parser.add_argument('--min-order', dest='min_order_amount', type=float, default=0)
+    parser.add_argument('--max-discount', type=float, default=None)
+    parser.add_argument('--free-category', dest='free_item_category', default=None)
+    parser.add_argument('--free-qty', dest='free_item_qty', type=int, default=None)
+    parser.add_argument('--expires', default=None, help='Expiry date, YYYY-MM-DD')
+    parser.add_argument('--description', default='')
+    return parser.parse_args()
+
+def time_code_lookups(campaign, samples=1000):
+    """Average time to find a promotion by code, probing codes from the new campaign"""
+    codes = [code for (code,) in db.session.query(Promotion.code)
+             .filter(Promotion.campaign == campaign).limit(samples * 10).all()]
+    codes = random.sample(codes, min(samples, len(codes)))
+    start = time.perf_counter()
+    for code in codes:
+        Promotion.query.filter_by(code=code).first()
+    return (time.perf_counter() - start) / len(codes) if codes else 0.0
+
+if __name__ == '__main__':
+    args = parse_args()
+    expires_at = datetime.strptime(args.expires, '%Y-%m-%d') if args.expires else None
+
+    with app.app_context():
+        print(f"🎟️  Generating {args.count:,} codes for {args.campaign}...")
+        result = create_campaign(
+            args.campaign, args.count, prefix=args.prefix, length=args.length,
+            description=args.description, discount_type=args.discount_type,
+            discount_value=args.discount_value, min_order_amount=args.min_order_amount,
+            max_discount=args.max_discount, expires_at=expires_at,
+            free_item_category=args.free_item_category, free_item_qty=args.free_item_qty
+        )
+        print(f"✓ Created {result}")
+
+        total = db.session.query(db.func.count(Promotion.id)).scalar()
+        print(f"✓ Lookup by code: {time_code_lookups(args.campaign) * 1000:.3f} ms average "
+              f"({total:,} promotions in the table)")
@@ -0,0 +1,42 @@
+# Gunicorn configuration for the order event stream
+# Serves /api/order_events (SSE) and /api/order_events/poll (long-polling).
+# Streams sit idle most of the time, so they run on cooperative gevent
+# workers instead of tying up the sync workers in gunicorn.conf.py.
+import multiprocessing
+
+# Server socket
+bind = "127.0.0.1:5001"
+backlog = 2048
+
+# Worker processes
+workers = multiprocessing.cpu_count()
+try:
+    import gevent  # noqa: F401
+    worker_class = 'gevent'
+    worker_connections = 5000  # Concurrent streams per worker
+except ImportError:
+    worker_class = 'gthread'
+    threads = 200
+timeout = 60
+keepalive = 75
+
+# Process naming
+proc_name = 'biryaniclub-stream'
+
+# Logging
+accesslog = '/var/log/biryaniclub/stream-access.log'
+errorlog = '/var/log/biryaniclub/stream-error.log'
+loglevel = 'info'
+
+# Process management
+daemon = False
+pidfile = '/var/run/biryaniclub/gunicorn-stream.pid'
+umask = 0
+user = 'biryaniclub'
+group = 'biryaniclub'
+
+# Server mechanics
+# Each worker starts its own event broker thread, so load the app after fork
+preload_app = False
+reload = False
+spew = False
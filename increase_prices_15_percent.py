@@ -3,20 +3,19 @@
 
 from app import app, db
 from models import MenuItem
-import math
+from bulk_menu import bulk_update_menu
 
 with app.app_context():
-    menu_items = MenuItem.query.all()
+    item_ids = [item_id for (item_id,) in db.session.query(MenuItem.id).all()]
     
-    print(f"Updating {len(menu_items)} menu items...")
+    # 15% increase, rounded up to whole rupees, in one UPDATE
+    result = bulk_update_menu(item_ids, price_mode='percent', price_value=15, rounding='whole')
+    
+    print(f"Updating {result.matched} menu items...")
     print(f"{'Item Name':<40} {'Old Price':>10} {'New Price':>10}")
     print("-" * 65)
     
-    for item in menu_items:
-        old_price = item.price
-        new_price = math.ceil(old_price * 1.15)  # 15% increase, rounded up
-        item.price = new_price
-        print(f"{item.name:<40} ₹{old_price:>9.2f} ₹{new_price:>9.2f}")
+    for change in result.changes:
+        print(f"{change.name:<40} ₹{change.old:>9.2f} ₹{change.new:>9.2f}")
     
-    db.session.commit()
     print("\n✅ All prices updated successfully! (+15%)")
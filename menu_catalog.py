@@ -0,0 +1,109 @@
+import threading
+import uuid
+from collections import namedtuple
+
+from models import db, MenuItem, StoreSettings
+from menu_search import MenuSearchIndex
+
+# StoreSettings key bumped whenever menu rows change; workers rebuild on mismatch
+MENU_VERSION_KEY = 'menu_version'
+
+_CATALOG_FIELDS = (
+    'id', 'name', 'description', 'price', 'category', 'emoji',
+    'in_stock', 'popularity', 'is_vegetarian', 'image_filename'
+)
+
+
+class CatalogItem(namedtuple('CatalogItem', _CATALOG_FIELDS)):
+    """Read-only copy of a MenuItem row, safe to share between requests"""
+    __slots__ = ()
+
+    has_image = MenuItem.has_image
+    image_url = MenuItem.image_url
+    veg_symbol = MenuItem.veg_symbol
+    veg_label = MenuItem.veg_label
+
+
+class MenuCatalog:
+    """Immutable snapshot of the menu with precomputed lookup lists"""
+
+    def __init__(self, version, items, previous=None):
+        self.version = version
+        # Same ordering as the menu page: most popular first
+        self.items = tuple(sorted(items, key=lambda item: (-(item.popularity or 0), item.id)))
+        self.by_id = {item.id: item for item in self.items}
+
+        by_category = {}
+        for item in sorted(items, key=lambda item: item.id):
+            by_category.setdefault(item.category, [])
+        for item in self.items:
+            by_category[item.category].append(item)
+        self.by_category = {category: tuple(group) for category, group in by_category.items()}
+        self.categories = tuple(self.by_category)
+        self.vegetarian = tuple(item for item in self.items if item.is_vegetarian)
+        self.popular = tuple(item for item in self.items if item.in_stock)
+        # Only items whose text changed since the previous snapshot are re-tokenized
+        self.search_index = MenuSearchIndex.build(
+            self.items, previous.search_index if previous is not None else None
+        )
+
+    @classmethod
+    def load(cls, version, previous=None):
+        rows = db.session.query(*(getattr(MenuItem, field) for field in _CATALOG_FIELDS)).all()
+        return cls(version, [CatalogItem(*row) for row in rows], previous)
+
+    def get(self, item_id):
+        """Look up an item by id (accepts form strings)"""
+        try:
+            return self.by_id.get(int(item_id))
+        except (TypeError, ValueError):
+            return None
+
+    def search(self, search_term, veg_only=False, limit=None):
+        """Typo-tolerant search over name, description and category, best match first"""
+        items = (self.by_id[item_id] for item_id in self.search_index.search(search_term))
+        if veg_only:
+            items = (item for item in items if item.is_vegetarian)
+        items = list(items)
+        return items[:limit] if limit is not None else items
+
+    def filter(self, search_term='', category='all', veg_only=False):
+        """Menu page filtering by search, category and veg mode"""
+        if search_term:
+            items = self.search(search_term, veg_only)
+            if category != 'all':
+                items = [item for item in items if item.category == category]
+            return items
+
+        if category != 'all':
+            items = self.by_category.get(category, ())
+            if veg_only:
+                items = [item for item in items if item.is_vegetarian]
+        else:
+            items = self.vegetarian if veg_only else self.items
+        return list(items)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_menu_catalog():
+    """Return the current snapshot, rebuilding it if another worker changed the menu"""
+    global _catalog
+    version = StoreSettings.get_setting(MENU_VERSION_KEY)
+    catalog = _catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    with _catalog_lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = MenuCatalog.load(version, previous=_catalog)
+        return _catalog
+
+
+def invalidate_menu_catalog():
+    """Call after committing menu changes so every worker rebuilds its snapshot"""
+    # The new version is visible to this worker immediately and to the others
+    # on their next settings version check
+    StoreSettings.set_setting(MENU_VERSION_KEY, uuid.uuid4().hex)
@@ -0,0 +1,187 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+# How much a match in each field counts towards an item's score
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'description': 1.0}
+# Popularity (0-10) adds at most this much to a matching item's score
+POPULARITY_WEIGHT = 0.5
+QUERY_CACHE_SIZE = 1024
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Lowercase alphanumeric words of a text"""
+    return _WORD_RE.findall((text or '').lower())
+
+
+def trigrams(word):
+    """Padded character trigrams, as used by pg_trgm"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(length):
+    """Typos tolerated for a query word of the given length"""
+    if length <= 3:
+        return 0
+    if length <= 5:
+        return 1
+    if length <= 9:
+        return 2
+    return 3
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (adjacent swaps cost 1), or limit + 1 if larger"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _item_fields(item):
+    return (
+        ('name', item.name),
+        ('category', item.category),
+        ('description', item.description),
+    )
+
+
+class MenuSearchIndex:
+    """Trigram inverted index over menu item words with typo-tolerant ranking"""
+
+    def __init__(self):
+        self.items = {}
+        self._item_words = {}  # item id -> {word: best field weight}
+        self._postings = defaultdict(dict)  # word -> {item id: best field weight}
+        self._trigrams = defaultdict(set)  # trigram -> words
+        self._vocabulary = []  # sorted words, for prefix lookups
+        self._cache = {}
+
+    @classmethod
+    def build(cls, items, previous=None):
+        """Index items, reusing word lists from previous for unchanged items"""
+        index = cls()
+        for item in items:
+            reuse = previous is not None and item.id in previous.items and \
+                _item_fields(previous.items[item.id]) == _item_fields(item)
+            words = previous._item_words[item.id] if reuse else None
+            index.add(item, words)
+        return index
+
+    def add(self, item, words=None):
+        """Add or replace one item"""
+        if item.id in self.items:
+            self.remove(item.id)
+        if words is None:
+            words = {}
+            for field, text in _item_fields(item):
+                weight = FIELD_WEIGHTS[field]
+                for word in tokenize(text):
+                    words[word] = max(words.get(word, 0), weight)
+
+        self.items[item.id] = item
+        self._item_words[item.id] = words
+        for word, weight in words.items():
+            if word not in self._postings:
+                for trigram in trigrams(word):
+                    self._trigrams[trigram].add(word)
+                position = bisect_left(self._vocabulary, word)
+                self._vocabulary.insert(position, word)
+            self._postings[word][item.id] = weight
+        self._cache.clear()
+
+    def remove(self, item_id):
+        """Drop one item from the index"""
+        self.items.pop(item_id, None)
+        for word in self._item_words.pop(item_id, {}):
+            postings = self._postings[word]
+            postings.pop(item_id, None)
+            if not postings:
+                del self._postings[word]
+                for trigram in trigrams(word):
+                    self._trigrams[trigram].discard(word)
+                self._vocabulary.pop(bisect_left(self._vocabulary, word))
+        self._cache.clear()
+
+    def _word_matches(self, token):
+        """Indexed words similar to a query token, with a similarity in (0, 1]"""
+        matches = {}
+        if token in self._postings:
+            matches[token] = 1.0
+
+        # Prefix matches keep typeahead working while the word is incomplete
+        position = bisect_left(self._vocabulary, token)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(token):
+            word = self._vocabulary[position]
+            matches.setdefault(word, 0.9)
+            position += 1
+
+        limit = max_edits(len(token))
+        if limit:
+            token_trigrams = trigrams(token)
+            shared = defaultdict(int)
+            for trigram in token_trigrams:
+                for word in self._trigrams.get(trigram, ()):
+                    shared[word] += 1
+            # Each edit changes at most three trigrams, so skip words that
+            # share too few to be within the edit limit
+            min_shared = len(token_trigrams) - 3 * limit
+            for word, count in shared.items():
+                if word in matches or count < min_shared:
+                    continue
+                distance = edit_distance(token, word, limit)
+                if distance <= limit:
+                    matches[word] = 0.8 * (1 - distance / (len(token) + 1))
+        return matches
+
+    def search(self, query, limit=None):
+        """Item ids ranked by relevance: all query words matched first, then score"""
+        tokens = tuple(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        cache_key = (tokens, limit)
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+
+        coverage = defaultdict(int)
+        scores = defaultdict(float)
+        for token in tokens:
+            best = {}
+            for word, similarity in self._word_matches(token).items():
+                for item_id, weight in self._postings[word].items():
+                    best[item_id] = max(best.get(item_id, 0), similarity * weight)
+            for item_id, score in best.items():
+                coverage[item_id] += 1
+                scores[item_id] += score
+
+        for item_id in scores:
+            scores[item_id] += POPULARITY_WEIGHT * (self.items[item_id].popularity or 0) / 10
+
+        ranked = sorted(scores, key=lambda item_id: (-coverage[item_id], -scores[item_id], item_id))
+        # When some item matches every word, drop the partial matches
+        if ranked and coverage[ranked[0]] == len(tokens):
+            ranked = [item_id for item_id in ranked if coverage[item_id] == len(tokens)]
+        if limit is not None:
+            ranked = ranked[:limit]
+
+        if len(self._cache) >= QUERY_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[cache_key] = ranked
+        return ranked
@@ -0,0 +1,26 @@
+
+from app import app, db
+from models import CartItem, CartSummary
+
+def backfill_cart_summaries():
+    """Create cart summaries for users whose carts predate the cart_summary table"""
+    with app.app_context():
+        db.create_all()
+        
+        user_ids = [row[0] for row in db.session.query(CartItem.user_id).distinct().all()]
+        existing = {row[0] for row in db.session.query(CartSummary.user_id).all()}
+        
+        created = 0
+        for user_id in user_ids:
+            if user_id in existing:
+                continue
+            CartSummary.refresh(user_id)
+            created += 1
+        
+        db.session.commit()
+        print(f"✓ Created cart summaries for {created} users")
+
+if __name__ == "__main__":
+    print("Starting cart summary backfill...")
+    backfill_cart_summaries()
+    print("\n✓ Migration completed successfully!")
@@ -0,0 +1,43 @@
+
+from app import app, db
+from models import CartItem, CartSummary, MAX_CART_QUANTITY
+
+def merge_duplicate_cart_items():
+    """Merge duplicate (user, menu item) cart lines so the unique index can be created"""
+    with app.app_context():
+        duplicates = db.session.query(CartItem.user_id, CartItem.menu_item_id)\
+                               .group_by(CartItem.user_id, CartItem.menu_item_id)\
+                               .having(db.func.count(CartItem.id) > 1).all()
+        
+        for user_id, menu_item_id in duplicates:
+            lines = CartItem.query.filter_by(user_id=user_id, menu_item_id=menu_item_id)\
+                                  .order_by(CartItem.id).all()
+            keep = lines[0]
+            keep.quantity = min(sum(line.quantity for line in lines), MAX_CART_QUANTITY)
+            for line in lines[1:]:
+                db.session.delete(line)
+            CartSummary.refresh(user_id)
+            print(f"User {user_id}, item {menu_item_id}: merged {len(lines)} lines into {keep.quantity}")
+        
+        db.session.commit()
+        print(f"\n✓ Merged {len(duplicates)} duplicate cart lines")
+
+def add_unique_index():
+    """Add the (user_id, menu_item_id) unique index used by the cart upsert"""
+    with app.app_context():
+        db.session.execute(db.text(
+            'CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_item_user_menu_item '
+            'ON cart_item (user_id, menu_item_id)'
+        ))
+        db.session.commit()
+        print("✓ Unique index uq_cart_item_user_menu_item is in place")
+
+if __name__ == "__main__":
+    print("Starting migration...")
+    print("\n1. Merging duplicate cart lines:")
+    merge_duplicate_cart_items()
+    
+    print("\n2. Adding unique index:")
+    add_unique_index()
+    
+    print("\n✓ Migration completed successfully!")
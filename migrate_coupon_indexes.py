@@ -0,0 +1,20 @@
+
+from app import app, db
+
+INDEXES = (
+    ('ix_coupon_usage_user_promotion', 'coupon_usage', 'user_id, promotion_id'),
+    ('ix_order_user_coupon_code', '"order"', 'user_id, coupon_code'),
+)
+
+def add_coupon_indexes():
+    """Add the indexes behind the per-user coupon redemption check"""
+    with app.app_context():
+        for name, table, columns in INDEXES:
+            db.session.execute(db.text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+            print(f"✓ Index {name} is in place")
+        db.session.commit()
+
+if __name__ == "__main__":
+    print("Starting migration...")
+    add_coupon_indexes()
+    print("\n✓ Migration completed successfully!")
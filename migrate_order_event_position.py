@@ -0,0 +1,24 @@
+from app import app, db
+
+def add_position_column():
+    """Add OrderEvent.position, the commit-ordered cursor for order change feeds"""
+    with app.app_context():
+        columns = [column['name'] for column in db.inspect(db.engine).get_columns('order_event')]
+        if 'position' not in columns:
+            db.session.execute(db.text('ALTER TABLE order_event ADD COLUMN position INTEGER'))
+            print("✓ Added order_event.position")
+        else:
+            print("✓ order_event.position already exists")
+        # Existing events are all committed, so their ids are already in commit order
+        result = db.session.execute(db.text('UPDATE order_event SET position = id WHERE position IS NULL'))
+        print(f"✓ Numbered {result.rowcount} existing events")
+        db.session.execute(db.text(
+            'CREATE UNIQUE INDEX IF NOT EXISTS ix_order_event_position ON order_event (position)'
+        ))
+        db.session.commit()
+        print("✓ Index ix_order_event_position is in place")
+
+if __name__ == "__main__":
+    print("Starting migration...")
+    add_position_column()
+    print("\n✓ Migration completed successfully!")
@@ -0,0 +1,22 @@
+
+from app import app, db
+
+def add_campaign_column():
+    """Add Promotion.campaign and its index for bulk-generated coupon codes"""
+    with app.app_context():
+        columns = [column['name'] for column in db.inspect(db.engine).get_columns('promotion')]
+        if 'campaign' not in columns:
+            db.session.execute(db.text('ALTER TABLE promotion ADD COLUMN campaign VARCHAR(40)'))
+            print("✓ Added promotion.campaign")
+        else:
+            print("✓ promotion.campaign already exists")
+        db.session.execute(db.text(
+            'CREATE INDEX IF NOT EXISTS ix_promotion_campaign ON promotion (campaign, id)'
+        ))
+        db.session.commit()
+        print("✓ Index ix_promotion_campaign is in place")
+
+if __name__ == "__main__":
+    print("Starting migration...")
+    add_campaign_column()
+    print("\n✓ Migration completed successfully!")
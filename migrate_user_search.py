@@ -0,0 +1,47 @@
+from app import app, db
+from models import User, normalize_phone
+
+BATCH_SIZE = 5000
+
+def add_user_search():
+    """Add User.phone_digits and the indexes behind the paginated admin user search"""
+    with app.app_context():
+        postgresql = db.session.get_bind().dialect.name == 'postgresql'
+        columns = [column['name'] for column in db.inspect(db.engine).get_columns('user')]
+        if 'phone_digits' not in columns:
+            db.session.execute(db.text('ALTER TABLE "user" ADD COLUMN phone_digits VARCHAR(15)'))
+            print("✓ Added user.phone_digits")
+        else:
+            print("✓ user.phone_digits already exists")
+
+        # Normalize existing phone numbers in batches
+        last_id, updated = 0, 0
+        while True:
+            rows = db.session.query(User.id, User.phone)\
+                             .filter(User.id > last_id, User.phone.isnot(None))\
+                             .order_by(User.id).limit(BATCH_SIZE).all()
+            if not rows:
+                break
+            db.session.execute(
+                db.update(User.__table__).where(User.__table__.c.id == db.bindparam('user_id'))
+                  .values(phone_digits=db.bindparam('digits')),
+                [{'user_id': row.id, 'digits': normalize_phone(row.phone)} for row in rows]
+            )
+            updated += len(rows)
+            last_id = rows[-1].id
+        print(f"✓ Normalized {updated} phone numbers")
+
+        if postgresql:
+            db.session.execute(db.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        connection = db.session.connection()
+        for index in User.__table__.indexes:
+            if index.name == 'ix_user_search_trgm' and not postgresql:
+                continue
+            index.create(bind=connection, checkfirst=True)
+            print(f"✓ Index {index.name} is in place")
+        db.session.commit()
+
+if __name__ == "__main__":
+    print("Starting migration...")
+    add_user_search()
+    print("\n✓ Migration completed successfully!")
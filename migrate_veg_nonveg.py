@@ -1,6 +1,7 @@
 
 from app import app, db
 from models import MenuItem
+from menu_catalog import invalidate_menu_catalog
 
 def categorize_veg_nonveg():
     """Categorize existing menu items as veg or non-veg based on their names"""
@@ -53,6 +54,7 @@ def categorize_veg_nonveg():
             print(f"{item.name}: {'Veg' if item.is_vegetarian else 'Non-Veg'}")
         
         db.session.commit()
+        invalidate_menu_catalog()
         print(f"\n✓ Successfully categorized {len(menu_items)} menu items")
 
 def increase_prices():
@@ -66,6 +68,7 @@ def increase_prices():
             print(f"{item.name}: ₹{old_price} → ₹{item.price}")
         
         db.session.commit()
+        invalidate_menu_catalog()
         print(f"\n✓ Successfully increased prices for {len(updated_items)} items by 15%")
 
 if __name__ == "__main__":
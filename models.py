@@ -1,27 +1,71 @@
-from datetime import datetime
+from datetime import datetime, date
+import json
 import pytz
 from werkzeug.security import generate_password_hash, check_password_hash
 import re
-import random
-import string
+import threading
+import time
+import uuid
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, validates
+from order_numbers import format_order_number
+import pricing
 
 db = SQLAlchemy()
 
+# Quantity limit per cart line, enforced in SQL by the cart upsert
+MAX_CART_QUANTITY = 10
+
 def ist_now():
     """Get current IST time"""
     ist = pytz.timezone('Asia/Kolkata')
     return datetime.now(ist).replace(tzinfo=None)
 
+def normalize_phone(phone):
+    """Digits of a phone number without the +91 / leading 0 prefix, as stored for search"""
+    digits = re.sub(r'\D', '', phone or '')
+    if (phone or '').lstrip().startswith('+91') or (len(digits) > 10 and digits.startswith('91')):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        digits = digits.lstrip('0')  # Trunk prefix
+    return digits or None
+
+def upsert_insert(model):
+    """INSERT construct supporting ON CONFLICT for the bound database (PostgreSQL or SQLite)"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
 
 class User(db.Model):
     __tablename__ = 'user'
+    __table_args__ = (
+        # Keyset pagination of the admin user list, unfiltered and by role or status
+        db.Index('ix_user_created_at_id', 'created_at', 'id'),
+        db.Index('ix_user_role_created_at_id', 'role', 'created_at', 'id'),
+        db.Index('ix_user_active_created_at_id', 'is_active', 'created_at', 'id'),
+        # Prefix search; text_pattern_ops lets PostgreSQL use them for LIKE 'term%'
+        db.Index('ix_user_username_lower', db.func.lower(db.column('username')).label('username_lower'),
+                 postgresql_ops={'username_lower': 'text_pattern_ops'}),
+        db.Index('ix_user_full_name_lower', db.func.lower(db.column('full_name')).label('full_name_lower'),
+                 postgresql_ops={'full_name_lower': 'text_pattern_ops'}),
+        db.Index('ix_user_email_lower', db.func.lower(db.column('email')).label('email_lower'),
+                 postgresql_ops={'email_lower': 'text_pattern_ops'}),
+        db.Index('ix_user_phone_digits', 'phone_digits', postgresql_ops={'phone_digits': 'text_pattern_ops'}),
+        # Substring search on PostgreSQL (pg_trgm)
+        db.Index('ix_user_search_trgm',
+                 db.text("(lower(coalesce(username, '') || ' ' || coalesce(full_name, '') || ' ' || email)) gin_trgm_ops"),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     full_name = db.Column(db.String(100))
     phone = db.Column(db.String(15), unique=True)
+    phone_digits = db.Column(db.String(15))  # normalize_phone(phone), kept in step by set_phone_digits
     role = db.Column(db.String(20), default='customer')  # customer, admin, delivery
     loyalty_points = db.Column(db.Integer, default=0)
     loyalty_tier = db.Column(db.String(20), default='bronze')  # bronze, silver, gold, platinum
@@ -33,6 +77,11 @@ class User(db.Model):
     delivered_orders = db.relationship('Order', foreign_keys='Order.delivery_person_id', backref='delivery_person_user', lazy=True)
     cart_items = db.relationship('CartItem', backref='user', lazy=True, cascade='all, delete-orphan')
 
+    @validates('phone')
+    def set_phone_digits(self, key, phone):
+        self.phone_digits = normalize_phone(phone)
+        return phone
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
@@ -94,6 +143,10 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+# The trigram index needs pg_trgm; create it along with a fresh user table
+event.listen(User.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
 class MenuItem(db.Model):
     __tablename__ = 'menu_item'
     id = db.Column(db.Integer, primary_key=True)
@@ -138,6 +191,9 @@ class MenuItem(db.Model):
 
 class CartItem(db.Model):
     __tablename__ = 'cart_item'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'menu_item_id', name='uq_cart_item_user_menu_item'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
@@ -151,11 +207,122 @@ class CartItem(db.Model):
     def total(self):
         return self.quantity * self.menu_item.price
 
+    @staticmethod
+    def add_quantity(user_id, menu_item_id, quantity):
+        """Insert a cart line or add to the existing one in a single statement (caller commits)"""
+        CartItem.add_quantities(user_id, {menu_item_id: quantity})
+
+    @staticmethod
+    def add_quantities(user_id, quantities):
+        """Add {menu_item_id: quantity} to the cart with one multi-row upsert (caller commits)"""
+        if not quantities:
+            return
+        stmt = upsert_insert(CartItem).values([
+            {
+                'user_id': user_id,
+                'menu_item_id': menu_item_id,
+                'quantity': min(quantity, MAX_CART_QUANTITY),
+                'created_at': ist_now()
+            }
+            for menu_item_id, quantity in quantities.items()
+        ])
+        combined = CartItem.quantity + stmt.excluded.quantity
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'menu_item_id'],
+            set_={'quantity': db.case((combined > MAX_CART_QUANTITY, MAX_CART_QUANTITY), else_=combined)}
+        )
+        db.session.execute(stmt)
+
+    @staticmethod
+    def set_quantities(user_id, quantities):
+        """Set {menu_item_id: quantity} in the cart; zero removes the line (caller commits)"""
+        removed = [menu_item_id for menu_item_id, quantity in quantities.items() if quantity <= 0]
+        kept = {menu_item_id: quantity for menu_item_id, quantity in quantities.items() if quantity > 0}
+        if removed:
+            CartItem.query.filter(CartItem.user_id == user_id, CartItem.menu_item_id.in_(removed))\
+                          .delete(synchronize_session=False)
+        if kept:
+            stmt = upsert_insert(CartItem).values([
+                {
+                    'user_id': user_id,
+                    'menu_item_id': menu_item_id,
+                    'quantity': min(quantity, MAX_CART_QUANTITY),
+                    'created_at': ist_now()
+                }
+                for menu_item_id, quantity in kept.items()
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['user_id', 'menu_item_id'],
+                set_={'quantity': stmt.excluded.quantity}
+            )
+            db.session.execute(stmt)
+
     def __repr__(self):
         return f'<CartItem {self.menu_item.name} x{self.quantity}>'
 
+class CartSummary(db.Model):
+    """Per-user cart totals, kept in step with cart_item so the cart badge is one lookup"""
+    __tablename__ = 'cart_summary'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(db.Float, nullable=False, default=0.0)
+    version = db.Column(db.Integer, nullable=False, default=0)  # Bumped on every cart change
+    updated_at = db.Column(db.DateTime, default=ist_now)
+
+    @staticmethod
+    def refresh(user_id):
+        """Recompute the user's totals in the current transaction (caller commits)"""
+        # Lock the summary row first so concurrent cart changes for one user serialize;
+        # the aggregate below then sees every change committed before the lock was granted
+        summary = CartSummary.query.filter_by(user_id=user_id).with_for_update().first()
+        if summary is None:
+            db.session.execute(
+                upsert_insert(CartSummary)
+                .values(user_id=user_id, item_count=0, subtotal=0.0, version=0, updated_at=ist_now())
+                .on_conflict_do_nothing(index_elements=['user_id'])
+            )
+            summary = CartSummary.query.filter_by(user_id=user_id)\
+                                       .with_for_update().populate_existing().one()
+        item_count, subtotal = db.session.query(
+            db.func.coalesce(db.func.sum(CartItem.quantity), 0),
+            db.func.coalesce(db.func.sum(CartItem.quantity * MenuItem.price), 0.0)
+        ).join(MenuItem, MenuItem.id == CartItem.menu_item_id)\
+         .filter(CartItem.user_id == user_id).one()
+
+        summary.item_count = int(item_count)
+        summary.subtotal = float(subtotal)
+        summary.version = (summary.version or 0) + 1
+        summary.updated_at = ist_now()
+        return summary
+
+    @staticmethod
+    def reset(user_id):
+        """Mark the user's cart as empty with a single upsert (caller commits)"""
+        stmt = upsert_insert(CartSummary).values(
+            user_id=user_id, item_count=0, subtotal=0.0, version=1, updated_at=ist_now()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={
+                'item_count': 0,
+                'subtotal': 0.0,
+                'version': CartSummary.version + 1,
+                'updated_at': stmt.excluded.updated_at
+            }
+        )
+        db.session.execute(stmt)
+
+    def __repr__(self):
+        return f'<CartSummary user={self.user_id} items={self.item_count} v{self.version}>'
+
 class Order(db.Model):
     __tablename__ = 'order'
+    __table_args__ = (
+        db.Index('ix_order_user_coupon_code', 'user_id', 'coupon_code'),  # Per-user coupon redemption probe
+        # Keyset pagination of the admin order list, with and without a status filter
+        db.Index('ix_order_created_at_id', 'created_at', 'id'),
+        db.Index('ix_order_status_created_at_id', 'status', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Nullable for guest orders
 
@@ -201,10 +368,8 @@ class Order(db.Model):
 
     @staticmethod
     def generate_order_number():
-        """Generate random order number"""
-        prefix = "BC"
-        random_part = ''.join(random.choices(string.digits, k=6))
-        return f"{prefix}{random_part}"
+        """Allocate the next order number (unique, non-sequential looking; needs an open session)"""
+        return format_order_number(OrderNumberSequence.next_value())
 
     @property
     def created_at_ist(self):
@@ -233,7 +398,7 @@ class Order(db.Model):
 class OrderItem(db.Model):
     __tablename__ = 'order_item'
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Float, nullable=False)
@@ -245,6 +410,224 @@ class OrderItem(db.Model):
     def __repr__(self):
         return f'<OrderItem {self.menu_item.name} x{self.quantity}>'
 
+class OrderNumberSequence(db.Model):
+    """Allocation log for order numbers; the autoincrement id is the sequence value"""
+    __tablename__ = 'order_number_sequence'
+    __table_args__ = {'sqlite_autoincrement': True}  # Never reuse ids, even after deletes
+    id = db.Column(db.Integer, primary_key=True)
+    allocated_at = db.Column(db.DateTime, default=ist_now)
+
+    @staticmethod
+    def next_value():
+        """Take the next value in the current transaction; safe across workers and nodes"""
+        allocation = OrderNumberSequence()
+        db.session.add(allocation)
+        db.session.flush()
+        return allocation.id
+
+class IdempotencyKey(db.Model):
+    """Client-generated key per form submission; repeats replay the stored result"""
+    __tablename__ = 'idempotency_key'
+    key = db.Column(db.String(64), primary_key=True)
+    scope = db.Column(db.String(30), nullable=False)  # e.g. checkout
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=True)
+    response_url = db.Column(db.String(200))  # Where the original request redirected
+    created_at = db.Column(db.DateTime, default=ist_now)
+
+    @staticmethod
+    def normalize(key):
+        """Return the key if it is well formed, otherwise None"""
+        key = (key or '').strip()
+        if 8 <= len(key) <= 64 and re.fullmatch(r'[A-Za-z0-9_-]+', key):
+            return key
+        return None
+
+    @staticmethod
+    def claim(key, scope, user_id=None):
+        """Reserve the key in the current transaction; False if it was already used.
+
+        While another transaction holds the same key uncommitted, the insert
+        waits on the primary key, so in-flight duplicates queue instead of racing.
+        """
+        result = db.session.execute(
+            upsert_insert(IdempotencyKey)
+            .values(key=key, scope=scope, user_id=user_id, created_at=ist_now())
+            .on_conflict_do_nothing(index_elements=['key'])
+        )
+        return result.rowcount == 1
+
+    @staticmethod
+    def complete(key, order_id, response_url):
+        """Store the outcome with the key in the current transaction (caller commits)"""
+        db.session.execute(
+            db.update(IdempotencyKey)
+            .where(IdempotencyKey.key == key)
+            .values(order_id=order_id, response_url=response_url)
+        )
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.scope} {self.key}>'
+
+class OutboxMessage(db.Model):
+    """Side effects queued in the same transaction as the change that caused them"""
+    __tablename__ = 'outbox_message'
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(50), nullable=False)  # e.g. coupon_usage.record, order.placed
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=ist_now, index=True)  # Next attempt
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=ist_now)
+    processed_at = db.Column(db.DateTime)
+
+    @staticmethod
+    def enqueue(topic, payload):
+        """Queue a message in the current transaction (caller commits); outbox_worker.py delivers it"""
+        message = OutboxMessage(topic=topic, payload=json.dumps(payload, default=str))
+        db.session.add(message)
+        return message
+
+    @property
+    def data(self):
+        return json.loads(self.payload)
+
+    def __repr__(self):
+        return f'<OutboxMessage {self.id} {self.topic} {self.status}>'
+
+class OrderEvent(db.Model):
+    """Append-only log of order changes; position is the cursor for change feeds"""
+    __tablename__ = 'order_event'
+    # Arbitrary pg_advisory_xact_lock key that orders commits of transactions with events
+    POSITION_LOCK_KEY = 4_210_001
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    event_type = db.Column(db.String(20), nullable=False)  # created, status, payment, assigned
+    status = db.Column(db.String(20), nullable=False)  # Order status after the change
+    # Ids are handed out at insert, so on PostgreSQL a higher id can commit before a lower one
+    # and a feed paging by id would skip it; positions are assigned in commit order instead
+    position = db.Column(db.Integer, unique=True, index=True)
+    created_at = db.Column(db.DateTime, default=ist_now)
+
+    @staticmethod
+    def record(order, event_type='status'):
+        """Queue an event for the order in the current transaction (caller commits)"""
+        event = OrderEvent(order_id=order.id, event_type=event_type, status=order.status or 'pending')
+        db.session.add(event)
+        db.session.info.setdefault('order_events', []).append(event)
+        return event
+
+    @staticmethod
+    def assign_positions(session):
+        """Number the events recorded in this transaction just before it commits
+
+        On PostgreSQL an advisory lock held until commit makes the next transaction wait
+        for this one to become visible; SQLite already serializes writers.
+        """
+        if session.in_nested_transaction() or not session.info.get('order_events'):
+            return
+        session.flush()
+        ids = sorted(event.id for event in session.info.pop('order_events') if event.id is not None)
+        if not ids:
+            return
+        if session.get_bind().dialect.name == 'postgresql':
+            session.execute(db.text('SELECT pg_advisory_xact_lock(:key)'), {'key': OrderEvent.POSITION_LOCK_KEY})
+        start = session.query(db.func.max(OrderEvent.position)).scalar() or 0
+        positions = {event_id: start + offset for offset, event_id in enumerate(ids, 1)}
+        session.execute(
+            db.update(OrderEvent).where(OrderEvent.id.in_(ids)).values(
+                position=db.case(positions, value=OrderEvent.id)
+            ),
+            execution_options={'synchronize_session': False}
+        )
+
+    @staticmethod
+    def latest_position():
+        """Return the newest event position, used as the starting cursor for a page"""
+        return db.session.query(db.func.max(OrderEvent.position)).scalar() or 0
+
+    def __repr__(self):
+        return f'<OrderEvent {self.id} order={self.order_id} {self.event_type}>'
+
+event.listen(Session, 'before_commit', OrderEvent.assign_positions)
+event.listen(Session, 'after_rollback', lambda session: session.info.pop('order_events', None))
+
+class DailySales(db.Model):
+    """Order totals per IST day and status, kept in step with order changes for the dashboard"""
+    __tablename__ = 'daily_sales'
+    # Totals over every day live under this sentinel date
+    ALL_TIME = date.min
+
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)  # The 'cancelled' rows count cancellations
+    confirmed_revenue = db.Column(db.Float, nullable=False, default=0.0)  # total_amount of paid orders
+    discount_total = db.Column(db.Float, nullable=False, default=0.0)
+
+    @staticmethod
+    def snapshot(order, payment_status=None):
+        """What an order contributes to the rollup: (day, status, revenue, discount)"""
+        payment_status = payment_status or order.payment_status
+        return (
+            order.created_at.date(),
+            order.status or 'pending',
+            (order.total_amount or 0) if payment_status == 'confirmed' else 0.0,
+            order.discount or 0
+        )
+
+    @staticmethod
+    def move(before, after):
+        """Shift an order's contribution from one snapshot to another (None = no order) with one upsert (caller commits)"""
+        if before == after:
+            return
+        deltas = {}
+        for snapshot, sign in ((before, -1), (after, 1)):
+            if snapshot is None:
+                continue
+            day, status, revenue, discount = snapshot
+            for key in ((day, status), (DailySales.ALL_TIME, status)):
+                count_delta, revenue_delta, discount_delta = deltas.get(key, (0, 0.0, 0.0))
+                deltas[key] = (count_delta + sign, revenue_delta + sign * revenue, discount_delta + sign * discount)
+
+        rows = [
+            {'day': day, 'status': status, 'order_count': count_delta,
+             'confirmed_revenue': revenue_delta, 'discount_total': discount_delta}
+            for (day, status), (count_delta, revenue_delta, discount_delta) in deltas.items()
+            if count_delta or revenue_delta or discount_delta
+        ]
+        if not rows:
+            return
+        stmt = upsert_insert(DailySales).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'status'],
+            set_={
+                'order_count': DailySales.order_count + stmt.excluded.order_count,
+                'confirmed_revenue': DailySales.confirmed_revenue + stmt.excluded.confirmed_revenue,
+                'discount_total': DailySales.discount_total + stmt.excluded.discount_total
+            }
+        )
+        db.session.execute(stmt)
+
+    @staticmethod
+    def dashboard_totals(today):
+        """All-time and today's rows in one query: {'all': {status: row}, 'today': {status: row}}"""
+        rows = DailySales.query.filter(DailySales.day.in_([DailySales.ALL_TIME, today])).all()
+        totals = {'all': {}, 'today': {}}
+        for row in rows:
+            totals['all' if row.day == DailySales.ALL_TIME else 'today'][row.status] = row
+        return totals
+
+    @staticmethod
+    def status_count(status):
+        """Orders currently in a status, from the all-time row"""
+        return db.session.query(DailySales.order_count)\
+                         .filter_by(day=DailySales.ALL_TIME, status=status).scalar() or 0
+
+    def __repr__(self):
+        return f'<DailySales {self.day} {self.status}: {self.order_count}>'
+
 class StoreSettings(db.Model):
     __tablename__ = 'store_settings'
     id = db.Column(db.Integer, primary_key=True)
@@ -252,27 +635,66 @@ class StoreSettings(db.Model):
     value = db.Column(db.String(500))
     updated_at = db.Column(db.DateTime, default=ist_now)
 
+    # Every write bumps this row; workers compare it to decide whether to reload
+    VERSION_KEY = '_settings_version'
+    # Seconds a worker trusts its cached settings before re-checking the version
+    CACHE_CHECK_INTERVAL = 5
+
+    _cache = {'version': None, 'values': None, 'checked_at': 0.0}
+    _cache_lock = threading.Lock()
+
+    @staticmethod
+    def _cached_values():
+        """All settings from the per-process cache, reloaded when the version changes"""
+        cache = StoreSettings._cache
+        now = time.monotonic()
+        if cache['values'] is not None and now - cache['checked_at'] < StoreSettings.CACHE_CHECK_INTERVAL:
+            return cache['values']
+
+        with StoreSettings._cache_lock:
+            if cache['values'] is not None and now - cache['checked_at'] < StoreSettings.CACHE_CHECK_INTERVAL:
+                return cache['values']
+            if cache['values'] is not None:
+                version = db.session.query(StoreSettings.value).filter_by(key=StoreSettings.VERSION_KEY).scalar()
+                if version == cache['version']:
+                    cache['checked_at'] = now
+                    return cache['values']
+            values = dict(db.session.query(StoreSettings.key, StoreSettings.value).all())
+            cache['version'] = values.pop(StoreSettings.VERSION_KEY, None)
+            cache['values'] = values
+            cache['checked_at'] = now
+            return values
+
+    @staticmethod
+    def invalidate_cache():
+        """Force the next read in this process to reload all settings"""
+        StoreSettings._cache['values'] = None
+
     @staticmethod
     def get_setting(key, default_value=None):
-        setting = StoreSettings.query.filter_by(key=key).first()
-        return setting.value if setting else default_value
+        return StoreSettings._cached_values().get(key, default_value)
 
     @staticmethod
     def set_setting(key, value):
-        setting = StoreSettings.query.filter_by(key=key).first()
-        if setting:
-            setting.value = value
-            setting.updated_at = ist_now()
-        else:
-            setting = StoreSettings(key=key, value=value)
-            db.session.add(setting)
+        for setting_key, setting_value in ((key, value), (StoreSettings.VERSION_KEY, uuid.uuid4().hex)):
+            setting = StoreSettings.query.filter_by(key=setting_key).first()
+            if setting:
+                setting.value = setting_value
+                setting.updated_at = ist_now()
+            else:
+                setting = StoreSettings(key=setting_key, value=setting_value)
+                db.session.add(setting)
         db.session.commit()
+        StoreSettings.invalidate_cache()
 
     def __repr__(self):
         return f'<StoreSettings {self.key}: {self.value}>'
 
 class Promotion(db.Model):
     __tablename__ = 'promotion'
+    __table_args__ = (
+        db.Index('ix_promotion_campaign', 'campaign', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(20), unique=True, nullable=False)
     description = db.Column(db.String(200))
@@ -290,6 +712,9 @@ class Promotion(db.Model):
     free_item_category = db.Column(db.String(50), nullable=True)
     free_item_qty = db.Column(db.Integer, default=1)
 
+    # Bulk-generated single-use codes (see bulk_coupons.py); NULL for regular promotions
+    campaign = db.Column(db.String(40), nullable=True)
+
     @property
     def created_at_ist(self):
         """Return created_at time (already in IST)"""
@@ -323,42 +748,55 @@ class Promotion(db.Model):
 
     def calculate_discount(self, subtotal, cart_items=None):
         """Calculate discount amount for given subtotal and cart items"""
-        if not self.is_valid or subtotal < self.min_order_amount:
+        if not self.is_valid:
             return 0, None
+        lines = [
+            pricing.CartLine(item.menu_item_id, item.quantity, item.menu_item.price, item.menu_item.category)
+            for item in cart_items or ()
+        ]
+        return pricing.calculate_discount(pricing.promotion_terms(self), subtotal, lines)
 
-        if self.discount_type == 'percentage':
-            discount = subtotal * (self.discount_value / 100)
-            if self.max_discount:
-                discount = min(discount, self.max_discount)
-            return discount, {'type': 'percentage', 'value': self.discount_value}
-        elif self.discount_type == 'fixed':
-            return min(self.discount_value, subtotal), {'type': 'fixed', 'value': self.discount_value}
-        elif self.discount_type == 'free_item_category' and cart_items:
-            # Find eligible items in the specified category
-            eligible_items = []
-            for item in cart_items:
-                if item.menu_item.category == self.free_item_category:
-                    for _ in range(item.quantity):
-                        eligible_items.append(item.menu_item.price)
-
-            if eligible_items:
-                # Sort by price and take cheapest items up to free_item_qty
-                eligible_items.sort()
-                free_items_count = min(len(eligible_items), self.free_item_qty)
-                discount = sum(eligible_items[:free_items_count])
-                return discount, {
-                    'type': 'free_item_category',
-                    'category': self.free_item_category,
-                    'qty': free_items_count,
-                    'items_freed': free_items_count
-                }
+    def use_promotion(self):
+        """Count one use if the usage limit allows it; False means the limit was reached (caller commits)"""
+        if not Promotion.consume(self.id):
+            return False
+        db.session.expire(self, ['used_count'])
+        return True
 
-        return 0, None
+    @staticmethod
+    def consume(promotion_id):
+        """use_promotion() by id, for callers holding a cached copy of the promotion"""
+        # Conditional increment in SQL so parallel checkouts can never oversubscribe the limit
+        used_count = db.func.coalesce(Promotion.used_count, 0)
+        result = db.session.execute(
+            db.update(Promotion)
+            .where(
+                Promotion.id == promotion_id,
+                Promotion.is_active.is_(True),
+                db.or_(
+                    Promotion.usage_limit.is_(None),
+                    Promotion.usage_limit == 0,
+                    used_count < Promotion.usage_limit
+                )
+            )
+            .values(used_count=used_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
 
-    def use_promotion(self):
-        """Mark promotion as used"""
-        self.used_count += 1
-        db.session.commit()
+    @staticmethod
+    def redeemed_by(user_id, promotion_id, code):
+        """Whether a user already used a promotion (recorded usage or placed order)"""
+        # Usage records are written by the outbox worker, so placed orders count too;
+        # cancelled ones do not, as cancelling frees the coupon for reuse.
+        # Both sides are covered by (user_id, ...) indexes.
+        return db.session.query(
+            db.exists().where(CouponUsage.user_id == user_id,
+                              CouponUsage.promotion_id == promotion_id) |
+            db.exists().where(Order.user_id == user_id,
+                              Order.coupon_code == code,
+                              Order.status != 'cancelled')
+        ).scalar()
 
     def __repr__(self):
         return f'<Promotion {self.code}>'
@@ -366,6 +804,9 @@ class Promotion(db.Model):
 class CouponUsage(db.Model):
     """Track individual coupon usage events for admin visibility"""
     __tablename__ = 'coupon_usage'
+    __table_args__ = (
+        db.Index('ix_coupon_usage_user_promotion', 'user_id', 'promotion_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -443,6 +884,74 @@ class CouponUsage(db.Model):
     def __repr__(self):
         return f'<CouponUsage {self.coupon_code} by {self.customer_display_name}>'
 
+class CouponDailyUsage(db.Model):
+    """Coupon uses and discount per IST day and code, kept in step with coupon_usage for analytics"""
+    __tablename__ = 'coupon_daily_usage'
+    __table_args__ = (
+        db.Index('ix_coupon_daily_usage_day_count', 'day', 'usage_count'),  # Top coupons
+    )
+    # Rows for all codes together use this code; all-time rows use DailySales.ALL_TIME
+    ALL_CODES = '*'
+
+    day = db.Column(db.Date, primary_key=True)
+    coupon_code = db.Column(db.String(20), primary_key=True)
+    usage_count = db.Column(db.Integer, nullable=False, default=0)
+    discount_total = db.Column(db.Float, nullable=False, default=0.0)
+
+    @staticmethod
+    def record(usage, sign=1):
+        """Add (sign=1) or remove (sign=-1) a CouponUsage with one upsert (caller commits)"""
+        day = usage.used_at.date()
+        rows = [
+            {'day': row_day, 'coupon_code': code, 'usage_count': sign,
+             'discount_total': sign * (usage.discount_amount or 0)}
+            for row_day in (day, DailySales.ALL_TIME)
+            for code in (usage.coupon_code, CouponDailyUsage.ALL_CODES)
+        ]
+        stmt = upsert_insert(CouponDailyUsage).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'coupon_code'],
+            set_={
+                'usage_count': CouponDailyUsage.usage_count + stmt.excluded.usage_count,
+                'discount_total': CouponDailyUsage.discount_total + stmt.excluded.discount_total
+            }
+        )
+        db.session.execute(stmt)
+
+    @staticmethod
+    def totals(today):
+        """(all-time, today) totals over every code; rows or None"""
+        rows = CouponDailyUsage.query.filter(
+            CouponDailyUsage.coupon_code == CouponDailyUsage.ALL_CODES,
+            CouponDailyUsage.day.in_([DailySales.ALL_TIME, today])
+        ).all()
+        by_day = {row.day: row for row in rows}
+        return by_day.get(DailySales.ALL_TIME), by_day.get(today)
+
+    @staticmethod
+    def used_codes():
+        """Every code with recorded usage, including inactive, deleted and campaign codes"""
+        return [code for (code,) in db.session.query(CouponDailyUsage.coupon_code).filter(
+            CouponDailyUsage.day == DailySales.ALL_TIME,
+            CouponDailyUsage.coupon_code != CouponDailyUsage.ALL_CODES
+        ).order_by(CouponDailyUsage.coupon_code)]
+
+    @staticmethod
+    def top_coupons(limit=5):
+        """Most used codes of all time: (coupon_code, usage_count, total_discount)"""
+        return db.session.query(
+            CouponDailyUsage.coupon_code,
+            CouponDailyUsage.usage_count,
+            CouponDailyUsage.discount_total.label('total_discount')
+        ).filter(
+            CouponDailyUsage.day == DailySales.ALL_TIME,
+            CouponDailyUsage.coupon_code != CouponDailyUsage.ALL_CODES,
+            CouponDailyUsage.usage_count > 0
+        ).order_by(CouponDailyUsage.usage_count.desc()).limit(limit).all()
+
+    def __repr__(self):
+        return f'<CouponDailyUsage {self.day} {self.coupon_code}: {self.usage_count}>'
+
 class Category(db.Model):
     __tablename__ = 'category'
     id = db.Column(db.Integer, primary_key=True)
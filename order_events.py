@@ -0,0 +1,111 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from models import db, Order, OrderEvent
+from utils import get_order_progress_percentage
+
+TERMINAL_STATUSES = ('delivered', 'cancelled')
+
+
+def event_payload(position, order_number, event_type, status):
+    """Build the client-facing payload for an order event; its id is the event's position"""
+    return {
+        'id': position,
+        'order_number': order_number,
+        'event_type': event_type,
+        'status': status,
+        'status_display': status.title().replace('_', ' '),
+        'progress_percentage': get_order_progress_percentage(status)
+    }
+
+
+def format_sse(payload, event='order_status'):
+    """Format a payload as a Server-Sent Events message"""
+    return f"id: {payload['id']}\nevent: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+class OrderEventBroker:
+    """Fan out order events to waiting subscribers in this worker process.
+
+    One background thread tails the order_event table and wakes every
+    subscriber, so idle streams cost no queries of their own.
+    """
+
+    def __init__(self, poll_interval=1.0, buffer_size=1000):
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._events = deque(maxlen=buffer_size)
+        self._cursor = 0
+        self._app = None
+        self._thread = None
+
+    def start(self, app):
+        """Start the tailing thread once per worker process"""
+        with self._condition:
+            if self._thread and self._thread.is_alive():
+                return
+            self._app = app
+            with app.app_context():
+                self._cursor = OrderEvent.latest_position()
+            self._thread = threading.Thread(target=self._run, name='order-event-broker', daemon=True)
+            self._thread.start()
+
+    def _fetch(self, since, order_ids=None, limit=500):
+        with self._app.app_context():
+            query = db.session.query(
+                OrderEvent.position, OrderEvent.order_id, OrderEvent.event_type,
+                OrderEvent.status, Order.order_number
+            ).join(Order, Order.id == OrderEvent.order_id).filter(OrderEvent.position > since)
+            if order_ids is not None:
+                query = query.filter(OrderEvent.order_id.in_(order_ids))
+            return [
+                (order_id, event_payload(position, order_number, event_type, status))
+                for position, order_id, event_type, status, order_number
+                in query.order_by(OrderEvent.position).limit(limit).all()
+            ]
+
+    def _run(self):
+        while True:
+            try:
+                rows = self._fetch(self._cursor)
+            except Exception as e:
+                logging.error(f"Order event broker poll failed: {e}")
+                rows = []
+            if rows:
+                with self._condition:
+                    self._events.extend(rows)
+                    # Positions are handed out in commit order, so nothing below this can still appear
+                    self._cursor = rows[-1][1]['id']
+                    self._condition.notify_all()
+            time.sleep(self.poll_interval)
+
+    def wait(self, order_ids, since, timeout):
+        """Wait up to timeout seconds for events on order_ids newer than since.
+
+        Returns (events, cursor) where cursor is the position the subscriber
+        has caught up to and should pass as since on the next call.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                cursor = max(since, self._cursor)
+                oldest = self._events[0][1]['id'] if self._events else self._cursor + 1
+                if since < oldest - 1 and since < self._cursor:
+                    # Subscriber is behind the buffer; read the gap from the table
+                    break
+                matches = [payload for order_id, payload in self._events
+                           if payload['id'] > since and order_id in order_ids]
+                if matches:
+                    return matches, cursor
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], cursor
+                self._condition.wait(remaining)
+        events = [payload for _, payload in self._fetch(since, order_ids)]
+        return events, events[-1]['id'] if events else cursor
+
+
+order_event_broker = OrderEventBroker()
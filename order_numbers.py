@@ -0,0 +1,49 @@
+import hashlib
+import os
+
+# Order numbers look like BC + 8 digits. Legacy numbers have 6 digits, so the
+# two formats can never collide.
+ORDER_NUMBER_PREFIX = 'BC'
+ORDER_NUMBER_DIGITS = 8
+ORDER_NUMBER_CAPACITY = 10 ** ORDER_NUMBER_DIGITS
+
+# Balanced Feistel network over 28-bit integers (2^28 >= 10^8), cycle-walked
+# down to the 8 digit range
+_HALF_BITS = 14
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 6
+
+# Never change the key once orders exist: a different key is a different
+# permutation and could reproduce numbers already issued
+_KEY = os.environ.get('ORDER_NUMBER_KEY', 'biryaniclub-order-numbers').encode()[:64]
+
+
+def _round_function(value, round_index):
+    digest = hashlib.blake2b(
+        value.to_bytes(4, 'big'), digest_size=4, key=_KEY, person=b'bc-round-%d' % round_index
+    ).digest()
+    return int.from_bytes(digest, 'big') & _HALF_MASK
+
+
+def _feistel(value):
+    left, right = value >> _HALF_BITS, value & _HALF_MASK
+    for round_index in range(_ROUNDS):
+        left, right = right, left ^ _round_function(right, round_index)
+    return (left << _HALF_BITS) | right
+
+
+def permute(sequence_value):
+    """Map 0..10^8-1 onto itself one-to-one in a scrambled, key-dependent order"""
+    if not 0 <= sequence_value < ORDER_NUMBER_CAPACITY:
+        raise ValueError(f'Order sequence {sequence_value} is outside the order number range')
+    value = _feistel(sequence_value)
+    # Cycle walking: the permutation of the 2^28 space restricted to 10^8 values
+    # is itself a permutation (about 2.7 rounds on average)
+    while value >= ORDER_NUMBER_CAPACITY:
+        value = _feistel(value)
+    return value
+
+
+def format_order_number(sequence_value):
+    """Order number for a sequence value; distinct values always give distinct numbers"""
+    return f'{ORDER_NUMBER_PREFIX}{permute(sequence_value):0{ORDER_NUMBER_DIGITS}d}'
@@ -0,0 +1,105 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+from models import db, OutboxMessage, CouponUsage, CouponDailyUsage, Order, ist_now
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+MAX_BACKOFF_SECONDS = 3600
+
+logger = logging.getLogger('outbox')
+
+# topic -> function(payload)
+HANDLERS = {}
+
+
+def handler(topic):
+    """Register the function that delivers messages for a topic"""
+    def register(func):
+        HANDLERS[topic] = func
+        return func
+    return register
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff before the next attempt: 2s, 4s, 8s ... capped at an hour"""
+    return min(2 ** attempts, MAX_BACKOFF_SECONDS)
+
+
+@handler('coupon_usage.record')
+def record_coupon_usage(payload):
+    """Write the detailed coupon usage record for an order"""
+    # Lock the order first, as cancel_order does, so a cancel runs wholly before or after this
+    status = db.session.query(Order.status).filter_by(id=payload['order_id']).with_for_update().scalar()
+    if status == 'cancelled':
+        return  # Cancelled before delivery; cancel_order had no record to remove
+    exists = db.session.query(CouponUsage.id).filter_by(
+        order_id=payload['order_id'],
+        promotion_id=payload['promotion_id']
+    ).first()
+    if exists:
+        return  # Already delivered by an earlier attempt
+
+    payload = dict(payload)
+    payload['used_at'] = datetime.fromisoformat(payload['used_at'])
+    usage = CouponUsage(**payload)
+    db.session.add(usage)
+    CouponDailyUsage.record(usage)
+
+
+@handler('order.placed')
+def order_placed(payload):
+    """Hook for post-order side effects (loyalty accrual, notifications)"""
+    logger.info(f"Order #{payload['order_number']} placed: ₹{payload['total_amount']:.2f} "
+                f"({payload['payment_method']})")
+
+
+def process_batch(batch_size=BATCH_SIZE):
+    """Deliver up to batch_size due messages; returns how many were handled"""
+    now = ist_now()
+    # SKIP LOCKED lets several workers drain the outbox without taking the same rows
+    messages = OutboxMessage.query.filter(
+        OutboxMessage.status == 'pending',
+        OutboxMessage.available_at <= now
+    ).order_by(OutboxMessage.id).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    for message in messages:
+        message.attempts = (message.attempts or 0) + 1
+        try:
+            topic_handler = HANDLERS.get(message.topic)
+            if topic_handler is None:
+                raise LookupError(f'No handler for topic {message.topic}')
+            # Each message gets a savepoint so one failure doesn't undo the others
+            with db.session.begin_nested():
+                topic_handler(message.data)
+            message.status = 'done'
+            message.processed_at = ist_now()
+            message.last_error = None
+        except Exception as e:
+            message.last_error = str(e)[:1000]
+            if message.attempts >= MAX_ATTEMPTS:
+                message.status = 'failed'
+                logger.error(f"Outbox message {message.id} ({message.topic}) failed permanently: {e}")
+            else:
+                message.available_at = ist_now() + timedelta(seconds=backoff_seconds(message.attempts))
+                logger.warning(f"Outbox message {message.id} ({message.topic}) failed, "
+                               f"attempt {message.attempts}: {e}")
+
+    db.session.commit()
+    return len(messages)
+
+
+def run_worker(app, poll_interval=1.0, batch_size=BATCH_SIZE):
+    """Drain the outbox forever, sleeping only when there is nothing due"""
+    logger.info('Outbox worker started')
+    while True:
+        with app.app_context():
+            try:
+                handled = process_batch(batch_size)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Outbox batch failed: {e}")
+                handled = 0
+        if handled < batch_size:
+            time.sleep(poll_interval)
@@ -0,0 +1,9 @@
+import logging
+import os
+from app import app
+from outbox import run_worker
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    poll_interval = float(os.environ.get('OUTBOX_POLL_INTERVAL', 1.0))
+    run_worker(app, poll_interval=poll_interval)
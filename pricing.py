@@ -0,0 +1,161 @@
+# Order pricing shared by the cart, checkout and coupon validation. Works on
+# plain snapshots only (no database access), so every call site agrees.
+import time
+from collections import namedtuple
+
+CartLine = namedtuple('CartLine', ['item_id', 'quantity', 'unit_price', 'category'])
+
+PromotionTerms = namedtuple('PromotionTerms', [
+    'id', 'code', 'discount_type', 'discount_value', 'min_order_amount',
+    'max_discount', 'free_item_category', 'free_item_qty'
+])
+
+PricingSettings = namedtuple('PricingSettings', ['base_delivery_charge', 'free_delivery_threshold'])
+
+Quote = namedtuple('Quote', ['subtotal', 'delivery_charges', 'discount', 'total', 'discount_meta'])
+
+DEFAULT_BASE_DELIVERY_CHARGE = 25.0
+DEFAULT_FREE_DELIVERY_THRESHOLD = 250.0
+DEFAULT_SETTINGS = PricingSettings(DEFAULT_BASE_DELIVERY_CHARGE, DEFAULT_FREE_DELIVERY_THRESHOLD)
+
+
+def promotion_terms(promotion):
+    """Snapshot the pricing fields of a Promotion (or None)"""
+    if promotion is None or isinstance(promotion, PromotionTerms):
+        return promotion
+    return PromotionTerms(
+        id=promotion.id,
+        code=promotion.code,
+        discount_type=promotion.discount_type,
+        discount_value=promotion.discount_value or 0,
+        min_order_amount=promotion.min_order_amount or 0,
+        max_discount=promotion.max_discount,
+        free_item_category=promotion.free_item_category,
+        free_item_qty=promotion.free_item_qty or 1
+    )
+
+
+def cart_subtotal(lines):
+    """Sum of quantity x unit price over the cart"""
+    return sum(line.quantity * line.unit_price for line in lines)
+
+
+def delivery_charge(subtotal, settings=DEFAULT_SETTINGS):
+    """Free delivery at or above the threshold, otherwise the base charge"""
+    if subtotal >= settings.free_delivery_threshold:
+        return 0
+    return settings.base_delivery_charge
+
+
+def calculate_discount(terms, subtotal, lines=()):
+    """Return (discount, meta) for a promotion; (0, None) if it does not apply"""
+    if terms is None or subtotal < terms.min_order_amount:
+        return 0, None
+
+    if terms.discount_type == 'percentage':
+        discount = subtotal * (terms.discount_value / 100)
+        if terms.max_discount:
+            discount = min(discount, terms.max_discount)
+        return min(discount, subtotal), {'type': 'percentage', 'value': terms.discount_value}
+    elif terms.discount_type == 'fixed':
+        return min(terms.discount_value, subtotal), {'type': 'fixed', 'value': terms.discount_value}
+    elif terms.discount_type == 'free_item_category' and lines:
+        # Cheapest eligible units are free, up to free_item_qty
+        eligible_prices = sorted(
+            line.unit_price
+            for line in lines if line.category == terms.free_item_category
+            for _ in range(line.quantity)
+        )
+        if eligible_prices:
+            free_items_count = min(len(eligible_prices), terms.free_item_qty)
+            return sum(eligible_prices[:free_items_count]), {
+                'type': 'free_item_category',
+                'category': terms.free_item_category,
+                'qty': free_items_count,
+                'items_freed': free_items_count
+            }
+
+    return 0, None
+
+
+def quote(lines, terms=None, settings=DEFAULT_SETTINGS):
+    """Price a cart in one pass: subtotal, delivery, discount and total"""
+    subtotal = cart_subtotal(lines)
+    delivery_charges = delivery_charge(subtotal, settings)
+    discount, meta = calculate_discount(terms, subtotal, lines)
+    return Quote(
+        subtotal=subtotal,
+        delivery_charges=delivery_charges,
+        discount=discount,
+        total=subtotal + delivery_charges - discount,
+        discount_meta=meta
+    )
+
+
+def discount_ceiling(terms):
+    """Largest discount a promotion can ever give, independent of the cart"""
+    if terms.discount_type == 'fixed':
+        return terms.discount_value
+    if terms.discount_type == 'percentage' and terms.max_discount:
+        return terms.max_discount
+    return float('inf')
+
+
+class _CategoryPrices:
+    """Unit prices of one category, cheapest first, with prefix sums"""
+    __slots__ = ('prices', 'prefix')
+
+    def __init__(self):
+        self.prices = []
+        self.prefix = None
+
+    def cheapest(self, count):
+        """Total price of the `count` cheapest units (and how many there were)"""
+        if self.prefix is None:
+            self.prices.sort()
+            self.prefix = [0]
+            for price in self.prices:
+                self.prefix.append(self.prefix[-1] + price)
+        count = min(count, len(self.prices))
+        return self.prefix[count], count
+
+
+def evaluate_promotions(lines, candidates, budget_seconds=None):
+    """Discount every candidate would give this cart; [(terms, discount, meta)], best first
+
+    The cart is summarised once, so each candidate costs O(1) whatever its type.
+    With a budget, evaluation stops when it runs out; pass candidates with the
+    most promising first (see discount_ceiling).
+    """
+    subtotal = cart_subtotal(lines)
+    by_category = {}
+    for line in lines:
+        prices = by_category.setdefault(line.category, _CategoryPrices()).prices
+        # Expand per unit; cart quantities are capped, so this stays small
+        prices.extend([line.unit_price] * line.quantity)
+
+    deadline = time.perf_counter() + budget_seconds if budget_seconds is not None else None
+    results = []
+    for index, terms in enumerate(candidates):
+        if deadline is not None and index % 32 == 0 and index and time.perf_counter() > deadline:
+            break
+        if subtotal < terms.min_order_amount:
+            continue
+        if terms.discount_type == 'free_item_category':
+            category_prices = by_category.get(terms.free_item_category)
+            if category_prices is None:
+                continue
+            discount, freed = category_prices.cheapest(terms.free_item_qty)
+            meta = {
+                'type': 'free_item_category',
+                'category': terms.free_item_category,
+                'qty': freed,
+                'items_freed': freed
+            }
+        else:
+            discount, meta = calculate_discount(terms, subtotal)
+        if discount > 0:
+            results.append((terms, discount, meta))
+
+    results.sort(key=lambda result: (-result[1], result[0].code))
+    return results
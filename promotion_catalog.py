@@ -0,0 +1,138 @@
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+import pricing
+from models import db, Promotion, StoreSettings, ist_now
+
+# StoreSettings key bumped whenever promotion rows change; workers reload on mismatch
+PROMOTION_VERSION_KEY = 'promotion_version'
+
+# used_count moves with every coupon order and doesn't bump the version, so the
+# snapshot is also refreshed on a timer. Checkout enforces the real limit.
+PROMOTION_CATALOG_TTL_SECONDS = 60
+
+# Checkout spends at most this long ranking offers, however many promotions are active
+BEST_OFFER_BUDGET_SECONDS = 0.005
+
+_CATALOG_FIELDS = (
+    'id', 'code', 'description', 'discount_type', 'discount_value', 'min_order_amount',
+    'max_discount', 'usage_limit', 'used_count', 'expires_at', 'free_item_category', 'free_item_qty',
+    'is_active'
+)
+
+
+def normalize_code(code):
+    """Promotion codes are stored upper case"""
+    return (code or '').upper().strip()
+
+
+class CatalogPromotion(namedtuple('CatalogPromotion', _CATALOG_FIELDS)):
+    """Read-only copy of a Promotion row, safe to share between requests"""
+    __slots__ = ()
+
+    @property
+    def terms(self):
+        return pricing.promotion_terms(self)
+
+    @property
+    def is_expired(self):
+        return bool(self.expires_at) and ist_now() > self.expires_at
+
+    @property
+    def is_usage_exceeded(self):
+        # As of the snapshot; Promotion.consume() has the final say
+        return bool(self.usage_limit) and (self.used_count or 0) >= self.usage_limit
+
+    @property
+    def is_valid(self):
+        return bool(self.is_active) and not self.is_expired and not self.is_usage_exceeded
+
+    def is_valid_at(self, now):
+        """is_valid with the clock read once by the caller"""
+        if not self.is_active or (self.expires_at and now > self.expires_at):
+            return False
+        return not self.is_usage_exceeded
+
+
+class PromotionCatalog:
+    """Immutable snapshot of the active (non-campaign) promotions"""
+
+    def __init__(self, version, promotions):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.promotions = tuple(promotions)
+        self.by_code = {promotion.code: promotion for promotion in self.promotions}
+        self.terms = {promotion.id: promotion.terms for promotion in self.promotions}
+        # Most generous first, so a budget-limited evaluation sees the likely winners
+        self.by_ceiling = tuple(sorted(
+            self.promotions, key=lambda promotion: (-pricing.discount_ceiling(self.terms[promotion.id]), promotion.id)
+        ))
+
+    @classmethod
+    def load(cls, version):
+        # Bulk campaign codes are private and numerous; they're looked up by index instead
+        rows = _promotion_rows().filter(Promotion.is_active.is_(True), Promotion.campaign.is_(None)).all()
+        return cls(version, [CatalogPromotion(*row) for row in rows])
+
+    @property
+    def is_stale(self):
+        return time.monotonic() - self.loaded_at > PROMOTION_CATALOG_TTL_SECONDS
+
+    def valid_promotions(self, exclude_codes=()):
+        """Currently valid promotions, most generous first, minus the excluded codes"""
+        now = ist_now()
+        return [
+            promotion for promotion in self.by_ceiling
+            if promotion.code not in exclude_codes and promotion.is_valid_at(now)
+        ]
+
+    def best_offers(self, lines, exclude_codes=(), budget_seconds=BEST_OFFER_BUDGET_SECONDS):
+        """Evaluate every valid promotion against a cart in one pass; best first"""
+        valid = self.valid_promotions(exclude_codes)
+        by_id = {promotion.id: promotion for promotion in valid}
+        results = pricing.evaluate_promotions(
+            lines, [self.terms[promotion.id] for promotion in valid], budget_seconds
+        )
+        return [(by_id[terms.id], discount, meta) for terms, discount, meta in results]
+
+
+def _promotion_rows():
+    return db.session.query(*(getattr(Promotion, field) for field in _CATALOG_FIELDS))
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_promotion_catalog():
+    """Return the current snapshot, reloading it if promotions changed or it has aged out"""
+    global _catalog
+    version = StoreSettings.get_setting(PROMOTION_VERSION_KEY)
+    catalog = _catalog
+    if catalog is not None and catalog.version == version and not catalog.is_stale:
+        return catalog
+
+    with _catalog_lock:
+        if _catalog is None or _catalog.version != version or _catalog.is_stale:
+            _catalog = PromotionCatalog.load(version)
+        return _catalog
+
+
+def invalidate_promotion_catalog():
+    """Call after committing promotion changes so every worker reloads its snapshot"""
+    StoreSettings.set_setting(PROMOTION_VERSION_KEY, uuid.uuid4().hex)
+
+
+def find_promotion(code):
+    """Promotion for a code (any case), from the snapshot when it is active"""
+    code = normalize_code(code)
+    if not code:
+        return None
+    promotion = get_promotion_catalog().by_code.get(code)
+    if promotion is None:
+        # Inactive or unknown codes aren't cached; the code column is unique-indexed
+        row = _promotion_rows().filter(Promotion.code == code).first()
+        promotion = CatalogPromotion(*row) if row else None
+    return promotion
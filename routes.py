@@ -1,20 +1,35 @@
 
 import os
-from flask import render_template, request, redirect, url_for, session, flash, jsonify
+import json
+import math
+import hashlib
+from flask import render_template, request, redirect, url_for, session, flash, jsonify, Response, abort, stream_with_context
 from datetime import datetime, timedelta
 import pytz
+from sqlalchemy.orm import selectinload
 
 # Import app and db from the main app module
 from app import app, db
-from models import User, MenuItem, CartItem, Order, OrderItem, StoreSettings, Promotion, CouponUsage
+from models import User, MenuItem, CartItem, CartSummary, Order, OrderItem, OrderEvent, DailySales, CouponDailyUsage, IdempotencyKey, OutboxMessage, StoreSettings, Promotion, CouponUsage
 from utils import (
     is_store_open, get_current_user, get_cart_items, get_cart_total, 
-    get_cart_count, clear_user_cart, validate_phone, validate_email,
-    find_user_by_login, apply_coupon, get_popular_items, get_categories,
-    generate_qr_code, get_order_progress_percentage, calculate_delivery_charges,
+    get_cart_count, get_cart_summary, clear_user_cart, invalidate_cart_cache, validate_phone, validate_email,
+    find_user_by_login, get_promotion_by_code, get_redeemed_coupon_codes, has_redeemed_promotion, get_pricing_settings, cart_lines, price_cart, get_popular_items, get_categories,
+    generate_qr_code, get_order_progress_percentage,
     get_ist_time, format_ist_datetime, ist_now
 )
 from image_utils import save_menu_item_image, delete_menu_item_image
+from order_events import order_event_broker, format_sse, TERMINAL_STATUSES
+from menu_catalog import get_menu_catalog, invalidate_menu_catalog
+from promotion_catalog import get_promotion_catalog, invalidate_promotion_catalog
+import pricing
+import bulk_coupons
+import bulk_menu
+from admin_queries import (
+    order_filters, filtered_orders, coupon_usage_filters, filtered_coupon_usage, user_filters, filtered_users,
+    keyset_page, page_size, DEFAULT_PAGE_SIZE
+)
+import exports
 
 @app.context_processor
 def inject_globals():
@@ -60,23 +75,9 @@ def menu():
     # Check veg mode from session (persistent)
     veg_mode = session.get('veg_mode', False)
     
-    # Base query - show all items
-    query = MenuItem.query
-    
-    # Apply search filter
-    if search_term:
-        query = query.filter(MenuItem.name.ilike(f'%{search_term}%'))
-    
-    # Apply category filter
-    if category_filter != 'all':
-        query = query.filter_by(category=category_filter)
-    
-    # Apply veg mode filter (persistent across page refreshes)
-    if veg_mode:
-        query = query.filter_by(is_vegetarian=True)
-    
-    # Get results
-    menu_items = query.order_by(MenuItem.popularity.desc()).all()
+    # Search, category and veg mode (persistent across page refreshes) filters
+    # are served from the in-memory menu snapshot
+    menu_items = get_menu_catalog().filter(search_term, category_filter, veg_mode)
     categories = get_categories()
     
     # Debug info
@@ -112,32 +113,16 @@ def add_to_cart():
         return redirect(url_for('menu'))
     
     # Check if item exists
-    menu_item = MenuItem.query.get(item_id)
+    menu_item = get_menu_catalog().get(item_id)
     if not menu_item or not menu_item.in_stock:
         flash('Item not available', 'error')
         return redirect(url_for('menu'))
     
-    # Check if item already in cart
-    existing_item = CartItem.query.filter_by(
-        user_id=session['user_id'],
-        menu_item_id=item_id
-    ).first()
-    
-    if existing_item:
-        # Update quantity
-        existing_item.quantity += quantity
-        if existing_item.quantity > 10:
-            existing_item.quantity = 10
-    else:
-        # Add new item
-        cart_item = CartItem(
-            user_id=session['user_id'],
-            menu_item_id=item_id,
-            quantity=quantity
-        )
-        db.session.add(cart_item)
-    
+    # Insert or add to the existing line in one statement (quantity capped at 10 in SQL)
+    CartItem.add_quantity(session['user_id'], menu_item.id, quantity)
+    CartSummary.refresh(session['user_id'])
     db.session.commit()
+    invalidate_cart_cache()
     flash(f'{menu_item.name} added to cart!', 'success')
     return redirect(url_for('menu'))
 
@@ -145,18 +130,18 @@ def add_to_cart():
 def cart():
     """Shopping cart page"""
     if 'user_id' not in session:
-        return render_template('cart.html', cart_items=[], subtotal=0, total=0, discount=0)
+        return render_template('cart.html', cart_items=[], subtotal=0, delivery_charges=0, total=0, discount=0)
     
+    # Same pricing path as checkout, so the page shows the total the order will have
     cart_items = get_cart_items()
-    subtotal = sum(item['total'] for item in cart_items)
-    discount = 0  # Can be calculated based on coupons
-    total = subtotal - discount
+    quote = price_cart(cart_items)
     
     return render_template('cart.html',
                          cart_items=cart_items,
-                         subtotal=subtotal,
-                         discount=discount,
-                         total=total)
+                         subtotal=quote.subtotal,
+                         delivery_charges=quote.delivery_charges,
+                         discount=quote.discount,
+                         total=quote.total)
 
 @app.route('/update_cart', methods=['POST'])
 def update_cart():
@@ -184,7 +169,9 @@ def update_cart():
             cart_item.quantity = min(quantity, 10)
             flash('Cart updated', 'success')
         
+        CartSummary.refresh(session['user_id'])
         db.session.commit()
+        invalidate_cart_cache()
     
     return redirect(url_for('cart'))
 
@@ -215,18 +202,31 @@ def checkout():
         flash('Sorry, we are currently closed', 'error')
         return redirect(url_for('cart'))
     
-    # Calculate delivery charges
-    delivery_charges = calculate_delivery_charges(subtotal)
+    # What every valid promotion would save on this cart, in one batch over the cached set
+    catalog = get_promotion_catalog()
+    offers = catalog.best_offers(
+        cart_lines(cart_items),
+        exclude_codes=get_redeemed_coupon_codes(session['user_id'])
+    )
+    offer_savings = {promotion.code: discount for promotion, discount, meta in offers}
+    best_code = offers[0][0].code if offers else None
     
-    # Apply coupon if provided
+    # Price the cart with the requested coupon, or preselect the best one
     coupon_code = request.args.get('coupon')
-    discount = apply_coupon(coupon_code, subtotal) if coupon_code else 0
-    total = subtotal + delivery_charges - discount
+    if coupon_code is None and best_code:
+        coupon_code = best_code
+        quote = price_cart(cart_items, offers[0][0].terms)
+    else:
+        promotion = get_promotion_by_code(coupon_code)
+        quote = price_cart(cart_items, promotion if promotion and promotion.is_valid else None)
+    subtotal, delivery_charges, discount, total = quote.subtotal, quote.delivery_charges, quote.discount, quote.total
     
-    # Get available promotions for display
-    available_promotions = Promotion.query.filter_by(is_active=True).filter(
-        Promotion.expires_at.is_(None) | (Promotion.expires_at > ist_now())
-    ).limit(8).all()
+    # Offers that apply to this cart first, then the rest
+    applicable = [promotion for promotion, discount, meta in offers]
+    applicable_ids = {promotion.id for promotion in applicable}
+    available_promotions = (applicable + [
+        promotion for promotion in catalog.valid_promotions() if promotion.id not in applicable_ids
+    ])[:8]
     
     return render_template('checkout.html',
                          cart_items=cart_items,
@@ -235,11 +235,19 @@ def checkout():
                          discount=discount,
                          total=total,
                          coupon_code=coupon_code,
+                         best_code=best_code,
+                         offer_savings=offer_savings,
                          available_promotions=available_promotions)
 
 @app.route('/checkout', methods=['POST'])
 def process_checkout():
     """Process checkout and create order"""
+    # A repeated submission of the same form replays the original result
+    idempotency_key = IdempotencyKey.normalize(request.form.get('idempotency_key'))
+    if idempotency_key and not IdempotencyKey.claim(idempotency_key, 'checkout', session.get('user_id')):
+        db.session.rollback()
+        return _replay_checkout(idempotency_key)
+    
     if not is_store_open():
         flash('Sorry, we are currently closed', 'error')
         return redirect(url_for('cart'))
@@ -280,41 +288,32 @@ def process_checkout():
         flash(f'Minimum order amount is ₹{MINIMUM_ORDER_AMOUNT}. Your cart total is ₹{subtotal:.0f}. Please add ₹{MINIMUM_ORDER_AMOUNT - subtotal:.0f} more to place an order.', 'error')
         return redirect(url_for('cart'))
     
-    delivery_charges = calculate_delivery_charges(subtotal)
-    discount = 0
-    
     # Validate and apply coupon
     applied_promotion = None
-    discount_meta = None
     
     if coupon_code:
-        promotion = Promotion.query.filter_by(code=coupon_code.upper().strip()).first()
+        promotion = get_promotion_by_code(coupon_code)
         if promotion and promotion.is_valid and subtotal >= promotion.min_order_amount:
             # Check if user has already used this coupon (for logged-in users only)
             if user_id:
-                existing_usage = CouponUsage.query.filter_by(
-                    user_id=user_id,
-                    promotion_id=promotion.id
-                ).first()
-                
-                if existing_usage:
+                if has_redeemed_promotion(user_id, promotion):
                     flash(f'You have already used the coupon code "{coupon_code}". Each coupon can only be used once per user.', 'error')
                     return redirect(url_for('checkout'))
             
-            # Get cart items for discount calculation
-            cart_db_items = CartItem.query.filter_by(user_id=user_id).all() if user_id else []
-            discount, meta = promotion.calculate_discount(subtotal, cart_db_items)
-            # Mark coupon as used
-            promotion.use_promotion()
-            # Store for usage tracking
+            # Store for usage tracking (the use is counted inside the order transaction)
             applied_promotion = promotion
-            discount_meta = meta
         else:
             # Invalid coupon, redirect back with error
             flash('Invalid or expired coupon code', 'error')
             return redirect(url_for('checkout'))
     
-    total = subtotal + delivery_charges - discount
+    # Subtotal, delivery, discount and total in one pass, same as the checkout page
+    quote = price_cart(cart_items, applied_promotion)
+    subtotal, delivery_charges, discount, total = quote.subtotal, quote.delivery_charges, quote.discount, quote.total
+    discount_meta = quote.discount_meta
+    
+    # Loaded once for the request; reused for the coupon usage record
+    current_user = get_current_user() if user_id else None
     
     try:
         # Create order
@@ -328,7 +327,7 @@ def process_checkout():
             discount=discount,
             total_amount=total,
             payment_method=payment_method,
-            coupon_code=coupon_code if coupon_code else None,
+            coupon_code=applied_promotion.code if applied_promotion else None,
             order_number=Order.generate_order_number()
         )
         
@@ -337,76 +336,93 @@ def process_checkout():
             order.guest_name = customer_name
             order.guest_phone = customer_phone
         
+        # Cash on delivery - mark as confirmed
+        if payment_method != 'upi':
+            order.payment_status = 'confirmed'
+            order.confirmed_at = ist_now()
+        
         db.session.add(order)
         db.session.flush()  # Get order ID
+        order_id = order.id
         
-        # Create order items
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                menu_item_id=cart_item['id'],
-                quantity=cart_item['quantity'],
-                unit_price=cart_item['price'],
-                total_price=cart_item['total']
-            )
-            db.session.add(order_item)
+        # Create order items with one bulk INSERT, however many lines the cart has
+        db.session.execute(db.insert(OrderItem), [
+            {
+                'order_id': order_id,
+                'menu_item_id': cart_item['id'],
+                'quantity': cart_item['quantity'],
+                'unit_price': cart_item['price'],
+                'total_price': cart_item['total']
+            }
+            for cart_item in cart_items
+        ])
+        
+        OrderEvent.record(order, 'created')
+        if payment_method != 'upi':
+            OrderEvent.record(order, 'payment')
+        DailySales.move(None, DailySales.snapshot(order))
         
         # Clear cart if user is logged in
         if user_id:
-            clear_user_cart(user_id)
+            clear_user_cart(user_id, commit=False)
         
-        db.session.commit()
-        
-        # Create detailed coupon usage record if coupon was applied
+        # Side effects are queued with the order and delivered by outbox_worker.py
         if applied_promotion and discount > 0:
-            try:
-                # Get current user info for tracking
-                current_user = User.query.get(user_id) if user_id else None
-                
-                # Determine discount type for tracking
-                discount_type = 'unknown'
-                if discount_meta:
-                    discount_type = discount_meta.get('type', 'unknown')
-                elif applied_promotion.discount_type:
-                    discount_type = applied_promotion.discount_type
-                
-                # Create usage record
-                coupon_usage = CouponUsage(
-                    user_id=user_id,
-                    username=current_user.username if current_user else None,
-                    user_email=current_user.email if current_user else None,
-                    guest_name=customer_name if not user_id else None,
-                    guest_phone=customer_phone if not user_id else None,
-                    guest_email=None,  # Not collected in current form
-                    promotion_id=applied_promotion.id,
-                    coupon_code=applied_promotion.code,
-                    order_id=order.id,
-                    order_number=order.order_number,
-                    order_subtotal=subtotal,
-                    discount_amount=discount,
-                    discount_type=discount_type,
-                    customer_ip=request.remote_addr,
-                    used_at=ist_now()
-                )
-                
-                db.session.add(coupon_usage)
-                db.session.commit()
-                
-            except Exception as usage_error:
-                # Log error but don't fail the order
-                app.logger.error(f"Failed to record coupon usage: {usage_error}")
-                # Don't rollback the main order, just log the error
+            # Determine discount type for tracking
+            discount_type = 'unknown'
+            if discount_meta:
+                discount_type = discount_meta.get('type', 'unknown')
+            elif applied_promotion.discount_type:
+                discount_type = applied_promotion.discount_type
+            
+            # Detailed coupon usage record
+            OutboxMessage.enqueue('coupon_usage.record', {
+                'user_id': user_id,
+                'username': current_user.username if current_user else None,
+                'user_email': current_user.email if current_user else None,
+                'guest_name': customer_name if not user_id else None,
+                'guest_phone': customer_phone if not user_id else None,
+                'guest_email': None,  # Not collected in current form
+                'promotion_id': applied_promotion.id,
+                'coupon_code': applied_promotion.code,
+                'order_id': order_id,
+                'order_number': order.order_number,
+                'order_subtotal': subtotal,
+                'discount_amount': discount,
+                'discount_type': discount_type,
+                'customer_ip': request.remote_addr,
+                'used_at': ist_now().isoformat()
+            })
+        
+        OutboxMessage.enqueue('order.placed', {
+            'order_id': order_id,
+            'order_number': order.order_number,
+            'user_id': user_id,
+            'total_amount': total,
+            'payment_method': payment_method
+        })
+        
+        # Count the coupon use last, so the promotion row stays locked only briefly
+        if applied_promotion and not Promotion.consume(applied_promotion.id):
+            db.session.rollback()
+            invalidate_cart_cache()
+            flash('This coupon has reached its usage limit', 'error')
+            return redirect(url_for('checkout'))
         
         # Redirect based on payment method
         if payment_method == 'upi':
-            return redirect(url_for('upi_payment', order_id=order.id))
+            response_url = url_for('upi_payment', order_id=order_id)
         else:
-            # Cash on delivery - mark as confirmed
-            order.payment_status = 'confirmed'
-            order.confirmed_at = ist_now()
-            db.session.commit()
+            response_url = url_for('order_confirmation', order_id=order_id)
+        if idempotency_key:
+            IdempotencyKey.complete(idempotency_key, order_id, response_url)
+        
+        # Order, items, cart, coupon use, events, outbox messages and the idempotency key are committed together
+        db.session.commit()
+        
+        if payment_method != 'upi':
             flash('Order placed successfully!', 'success')
-            return redirect(url_for('order_confirmation', order_id=order.id))
+        return redirect(response_url)
             
     except Exception as e:
         db.session.rollback()
@@ -414,6 +430,14 @@ def process_checkout():
         flash('An error occurred while processing your order. Please try again.', 'error')
         return redirect(url_for('checkout'))
 
+def _replay_checkout(idempotency_key):
+    """Redirect a duplicate checkout submission to where the original one went"""
+    existing = IdempotencyKey.query.get(idempotency_key)
+    if existing and existing.response_url and existing.user_id == session.get('user_id'):
+        return redirect(existing.response_url)
+    flash('This order has already been submitted', 'info')
+    return redirect(url_for('my_orders') if 'user_id' in session else url_for('menu'))
+
 @app.route('/upi_payment/<int:order_id>')
 def upi_payment(order_id):
     """UPI payment page with QR code"""
@@ -426,29 +450,45 @@ def upi_payment(order_id):
                          order=order,
                          qr_code=qr_code)
 
+def _lock_order(order_id):
+    """Load an order for a state change, holding its row lock until commit"""
+    # Concurrent changes to one order serialize, so each sees the state the rollup last saw
+    return Order.query.filter_by(id=order_id).with_for_update().first_or_404()
+
 @app.route('/confirm_payment/<int:order_id>', methods=['POST'])
 def confirm_payment(order_id):
     """Confirm UPI payment"""
-    order = Order.query.get_or_404(order_id)
-    
-    # Update order status
-    order.payment_status = 'confirmed'
-    order.confirmed_at = datetime.utcnow()
-    db.session.commit()
+    order = _lock_order(order_id)
+    
+    # Update order status only once; repeated POSTs change nothing
+    before = DailySales.snapshot(order)
+    result = db.session.execute(
+        db.update(Order)
+        .where(Order.id == order.id, Order.payment_status != 'confirmed')
+        .values(payment_status='confirmed', confirmed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        OrderEvent.record(order, 'payment')
+        DailySales.move(before, DailySales.snapshot(order, payment_status='confirmed'))
+        db.session.commit()
+    else:
+        db.session.rollback()
     
     flash('Payment confirmed! Your order is being prepared.', 'success')
-    return redirect(url_for('order_confirmation', order_id=order.id))
+    return redirect(url_for('order_confirmation', order_id=order_id))
 
 @app.route('/order_confirmation/<int:order_id>')
 def order_confirmation(order_id):
     """Order confirmation page"""
     order = Order.query.get_or_404(order_id)
-    return render_template('order_confirmation.html', order=order)
+    return render_template('order_confirmation.html', order=order,
+                         order_event_cursor=OrderEvent.latest_position())
 
 @app.route('/cancel_order/<int:order_id>', methods=['POST'])
 def cancel_order(order_id):
     """Cancel an order within 3 minutes of placement"""
-    order = Order.query.get_or_404(order_id)
+    order = _lock_order(order_id)
     
     # Check if order is already cancelled or delivered
     if order.status in ['cancelled', 'delivered']:
@@ -466,19 +506,25 @@ def cancel_order(order_id):
     
     try:
         # Update order status to cancelled
+        before = DailySales.snapshot(order)
         order.status = 'cancelled'
         order.cancelled_at = now
+        DailySales.move(before, DailySales.snapshot(order))
         
         # If coupon was used, remove the usage record to allow reuse
         if order.coupon_code:
             coupon = Promotion.query.filter_by(code=order.coupon_code).first()
             if coupon and order.user_id:
-                CouponUsage.query.filter_by(
+                usages = CouponUsage.query.filter_by(
                     user_id=order.user_id,
                     coupon_code=order.coupon_code,
                     order_id=order.id
-                ).delete()
+                ).all()
+                for usage in usages:
+                    CouponDailyUsage.record(usage, sign=-1)
+                    db.session.delete(usage)
         
+        OrderEvent.record(order)
         db.session.commit()
         
         # Create refund message based on payment method
@@ -504,13 +550,15 @@ def my_orders():
         flash('Please log in to view your orders', 'warning')
         return redirect(url_for('login'))
     
+    order_event_cursor = OrderEvent.latest_position()
     orders = Order.query.filter_by(user_id=session['user_id']).order_by(Order.created_at.desc()).all()
     
     # Get current IST time for last updated
     ist_timezone = pytz.timezone('Asia/Kolkata')
     current_ist = datetime.now(ist_timezone)
     
-    return render_template('my_orders.html', orders=orders, current_ist=current_ist)
+    return render_template('my_orders.html', orders=orders, current_ist=current_ist,
+                         order_event_cursor=order_event_cursor)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -665,11 +713,15 @@ def admin():
         flash('Access denied', 'error')
         return redirect(url_for('home'))
     
-    # Get dashboard statistics
-    total_orders = Order.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
-    today_orders = Order.query.filter(Order.created_at >= datetime.now().date()).count()
-    total_revenue = db.session.query(db.func.sum(Order.total_amount)).filter_by(payment_status='confirmed').scalar() or 0
+    # Take the change-feed cursor before reading so no update is missed
+    order_cursor = OrderEvent.latest_position()
+    
+    # Dashboard statistics from the daily rollup: today's and the all-time rows only
+    totals = DailySales.dashboard_totals(ist_now().date())
+    total_orders = sum(row.order_count for row in totals['all'].values())
+    pending_orders = totals['all']['pending'].order_count if 'pending' in totals['all'] else 0
+    today_orders = sum(row.order_count for row in totals['today'].values())
+    total_revenue = sum(row.confirmed_revenue for row in totals['all'].values())
     
     # Recent orders
     recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
@@ -679,7 +731,8 @@ def admin():
                          pending_orders=pending_orders,
                          today_orders=today_orders,
                          total_revenue=total_revenue,
-                         recent_orders=recent_orders)
+                         recent_orders=recent_orders,
+                         order_cursor=order_cursor)
 
 @app.route('/admin/toggle_store', methods=['POST'])
 def toggle_store():
@@ -693,8 +746,12 @@ def toggle_store():
         flash('Access denied', 'error')
         return redirect(url_for('home'))
     
-    current_status = is_store_open()
-    new_status = 'false' if current_status else 'true'
+    # The form says which state the admin asked for; is_store_open() is served from a
+    # cache that can be seconds stale, so flipping it could rewrite the current value
+    new_status = request.form.get('store_open')
+    if new_status not in ('true', 'false'):
+        current_status = db.session.query(StoreSettings.value).filter_by(key='store_open').scalar() or 'true'
+        new_status = 'false' if current_status.lower() == 'true' else 'true'
     
     StoreSettings.set_setting('store_open', new_status)
     
@@ -715,17 +772,48 @@ def admin_orders():
         flash('Access denied', 'error')
         return redirect(url_for('home'))
     
-    status_filter = request.args.get('status', 'all')
+    filters = order_filters(request.args)
+    per_page = page_size(request.args.get('per_page'))
+    order_cursor = OrderEvent.latest_position()
+    
+    # Keyset pagination on (created_at, id); items and their menu items in two extra queries
+    query = filtered_orders(filters).options(
+        selectinload(Order.order_items).selectinload(OrderItem.menu_item)
+    )
+    page = keyset_page(query, Order.created_at, Order.id,
+                       before=request.args.get('before'), after=request.args.get('after'),
+                       limit=per_page)
+    
+    # Query args that keep the current filters when paging or switching status
+    filter_args = {
+        'from': request.args.get('from') if filters.date_from else None,
+        'to': request.args.get('to') if filters.date_to else None,
+        'per_page': per_page if per_page != DEFAULT_PAGE_SIZE else None
+    }
+    filter_args = {key: value for key, value in filter_args.items() if value is not None}
     
-    # Base query
-    query = Order.query
+    return render_template('admin_orders.html', orders=page.rows, page=page,
+                         status_filter=filters.status, filters=filters, filter_args=filter_args,
+                         per_page=per_page, order_cursor=order_cursor,
+                         is_first_page=page.newer is None)
+
+@app.route('/admin/orders/export.<fmt>')
+def export_orders(fmt):
+    """Download the filtered order list, one row per order line"""
+    if 'user_id' not in session:
+        flash('Please log in as admin', 'warning')
+        return redirect(url_for('login'))
     
-    if status_filter != 'all':
-        query = query.filter_by(status=status_filter)
+    user = get_current_user()
+    if not user or not user.is_admin():
+        flash('Access denied', 'error')
+        return redirect(url_for('home'))
     
-    orders = query.order_by(Order.created_at.desc()).all()
+    if fmt not in exports.EXPORT_FORMATS:
+        abort(404)
     
-    return render_template('admin_orders.html', orders=orders, status_filter=status_filter)
+    query = exports.order_line_rows(filtered_orders(order_filters(request.args)))
+    return exports.export_response(query, exports.ORDER_COLUMNS, 'orders', fmt)
 
 @app.route('/admin/update_order_status', methods=['POST'])
 def update_order_status():
@@ -742,12 +830,15 @@ def update_order_status():
     order_id = request.form.get('order_id')
     new_status = request.form.get('status')
     
-    order = Order.query.get_or_404(order_id)
+    order = _lock_order(order_id)
+    before = DailySales.snapshot(order)
     order.status = new_status
     
     if new_status == 'delivered':
         order.delivery_time = ist_now()
     
+    OrderEvent.record(order)
+    DailySales.move(before, DailySales.snapshot(order))
     db.session.commit()
     
     flash(f'Order {order.order_number} status updated to {new_status}', 'success')
@@ -766,26 +857,47 @@ def admin_users():
         flash('Access denied', 'error')
         return redirect(url_for('home'))
     
-    # Get all users with filtering
-    role_filter = request.args.get('role', 'all')
-    status_filter = request.args.get('status', 'all')
+    filters = user_filters(request.args)
+    per_page = page_size(request.args.get('per_page'))
     
-    query = User.query
+    # Keyset pagination on (created_at, id), newest first
+    page = keyset_page(filtered_users(filters), User.created_at, User.id,
+                       before=request.args.get('before'), after=request.args.get('after'),
+                       limit=per_page)
     
-    if role_filter != 'all':
-        query = query.filter_by(role=role_filter)
+    # Query args that keep the current filters when paging
+    filter_args = {'role': filters.role, 'status': filters.status}
+    if filters.search:
+        filter_args['q'] = filters.search
+    if per_page != DEFAULT_PAGE_SIZE:
+        filter_args['per_page'] = per_page
     
-    if status_filter == 'active':
-        query = query.filter_by(is_active=True)
-    elif status_filter == 'inactive':
-        query = query.filter_by(is_active=False)
+    return render_template('admin_users.html', 
+                         users=page.rows, 
+                         page=page,
+                         filter_args=filter_args,
+                         search_term=filters.search,
+                         role_filter=filters.role,
+                         status_filter=filters.status)
+
+@app.route('/admin/users/export.<fmt>')
+def export_users(fmt):
+    """Download the filtered user list"""
+    if 'user_id' not in session:
+        flash('Please log in as admin', 'warning')
+        return redirect(url_for('login'))
     
-    users = query.order_by(User.created_at.desc()).all()
+    user = get_current_user()
+    if not user or not user.is_admin():
+        flash('Access denied', 'error')
+        return redirect(url_for('home'))
     
-    return render_template('admin_users.html', 
-                         users=users, 
-                         role_filter=role_filter,
-                         status_filter=status_filter)
+    if fmt not in exports.EXPORT_FORMATS:
+        abort(404)
+    
+    query = filtered_users(user_filters(request.args)).order_by(User.created_at.desc(), User.id.desc())
+    return exports.export_response(exports.column_rows(query, exports.USER_COLUMNS),
+                                   exports.USER_COLUMNS, 'users', fmt)
 
 @app.route('/admin/users/<int:user_id>/toggle_status', methods=['POST'])
 def toggle_user_status(user_id):
@@ -923,6 +1035,7 @@ def toggle_menu_item_stock(item_id):
     menu_item = MenuItem.query.get_or_404(item_id)
     menu_item.in_stock = not menu_item.in_stock
     db.session.commit()
+    invalidate_menu_catalog()
     
     status_text = 'marked as available' if menu_item.in_stock else 'marked as out of stock'
     flash(f'{menu_item.name} has been {status_text}', 'success')
@@ -949,23 +1062,18 @@ def bulk_update_stock():
             flash('No items selected for update', 'warning')
             return redirect(url_for('admin_menu'))
         
-        # Update selected items
-        updated_items = []
-        for item_id in item_ids:
-            menu_item = MenuItem.query.get(item_id)
-            if menu_item:
-                menu_item.in_stock = in_stock
-                updated_items.append(menu_item.name)
-        
-        db.session.commit()
+        # One UPDATE for every selected item
+        result = bulk_menu.bulk_update_menu(item_ids, in_stock=in_stock)
         
         # Create success message
         status_text = 'available' if in_stock else 'out of stock'
-        if len(updated_items) == 1:
-            flash(f'{updated_items[0]} has been marked as {status_text}', 'success')
+        if result.matched == 1 and result.changes:
+            flash(f'{result.changes[0].name} has been marked as {status_text}', 'success')
         else:
-            flash(f'{len(updated_items)} items have been marked as {status_text}', 'success')
+            flash(f'{result.matched} items have been marked as {status_text}', 'success')
         
+    except ValueError as e:
+        flash(str(e), 'error')
     except Exception as e:
         db.session.rollback()
         app.logger.error(f"Bulk stock update error: {e}")
@@ -1023,6 +1131,7 @@ def add_menu_item():
                         flash(f'Menu item added but image upload failed: {filename_or_error}', 'warning')
             
             db.session.commit()
+            invalidate_menu_catalog()
             
             if 'image' not in request.files or not request.files['image'].filename:
                 flash(f'{new_item.name} added to menu successfully', 'success')
@@ -1092,6 +1201,7 @@ def edit_menu_item(item_id):
                         flash(f'Error updating image: {filename_or_error}', 'warning')
             
             db.session.commit()
+            invalidate_menu_catalog()
             flash(f'{menu_item.name} updated successfully', 'success')
             return redirect(url_for('admin_menu'))
             
@@ -1116,10 +1226,10 @@ def admin_promotions():
         flash('Access denied', 'error')
         return redirect(url_for('home'))
     
-    # Get all promotions
+    # Get all promotions (bulk campaign codes are summarised per campaign instead)
     status_filter = request.args.get('status', 'all')
     
-    query = Promotion.query
+    query = Promotion.query.filter(Promotion.campaign.is_(None))
     
     if status_filter == 'active':
         query = query.filter_by(is_active=True)
@@ -1132,6 +1242,7 @@ def admin_promotions():
     
     return render_template('admin_promotions.html', 
                          promotions=promotions,
+                         campaigns=bulk_coupons.campaign_summaries(),
                          status_filter=status_filter)
 
 @app.route('/admin/promotions/add', methods=['GET', 'POST'])
@@ -1184,6 +1295,7 @@ def add_promotion():
             
             db.session.add(new_promotion)
             db.session.commit()
+            invalidate_promotion_catalog()
             
             flash(f'Promotion {new_promotion.code} created successfully', 'success')
             return redirect(url_for('admin_promotions'))
@@ -1233,6 +1345,7 @@ def edit_promotion(promotion_id):
                 promotion.expires_at = None
             
             db.session.commit()
+            invalidate_promotion_catalog()
             flash(f'Promotion {promotion.code} updated successfully', 'success')
             return redirect(url_for('admin_promotions'))
             
@@ -1294,15 +1407,18 @@ def assign_order(order_id):
         flash('Access denied', 'error')
         return redirect(url_for('home'))
     
-    order = Order.query.get_or_404(order_id)
+    order = _lock_order(order_id)
     
     if order.delivery_person_id:
         flash('Order already assigned to another delivery person', 'warning')
     else:
+        before = DailySales.snapshot(order)
         order.delivery_person_id = user.id
         if order.status == 'confirmed':
             order.status = 'preparing'
         
+        OrderEvent.record(order, 'assigned')
+        DailySales.move(before, DailySales.snapshot(order))
         db.session.commit()
         flash(f'Order #{order.order_number} assigned to you', 'success')
     
@@ -1319,12 +1435,15 @@ def pickup_order(order_id):
         flash('Access denied', 'error')
         return redirect(url_for('home'))
     
-    order = Order.query.get_or_404(order_id)
+    order = _lock_order(order_id)
     
     if order.delivery_person_id != user.id:
         flash('You can only pick up orders assigned to you', 'error')
     else:
+        before = DailySales.snapshot(order)
         order.status = 'out_for_delivery'
+        OrderEvent.record(order)
+        DailySales.move(before, DailySales.snapshot(order))
         db.session.commit()
         flash(f'Order #{order.order_number} marked as out for delivery', 'success')
     
@@ -1341,15 +1460,18 @@ def complete_delivery(order_id):
         flash('Access denied', 'error')
         return redirect(url_for('home'))
     
-    order = Order.query.get_or_404(order_id)
+    order = _lock_order(order_id)
     
     if order.delivery_person_id != user.id:
         flash('You can only deliver orders assigned to you', 'error')
     else:
+        before = DailySales.snapshot(order)
         order.status = 'delivered'
         order.delivery_time = ist_now()
         order.payment_status = 'confirmed'  # Mark payment as confirmed on delivery
         
+        OrderEvent.record(order)
+        DailySales.move(before, DailySales.snapshot(order))
         db.session.commit()
         flash(f'Order #{order.order_number} marked as delivered!', 'success')
     
@@ -1374,6 +1496,7 @@ def toggle_promotion_status(promotion_id):
     promotion = Promotion.query.get_or_404(promotion_id)
     promotion.is_active = not promotion.is_active
     db.session.commit()
+    invalidate_promotion_catalog()
     
     status_text = 'activated' if promotion.is_active else 'deactivated'
     flash(f'Promotion {promotion.code} has been {status_text}', 'success')
@@ -1396,10 +1519,80 @@ def delete_promotion(promotion_id):
     
     db.session.delete(promotion)
     db.session.commit()
+    invalidate_promotion_catalog()
     
     flash(f'Promotion {code} has been deleted', 'success')
     return redirect(url_for('admin_promotions'))
 
+@app.route('/admin/promotions/bulk', methods=['GET', 'POST'])
+def bulk_promotions():
+    """Generate a campaign of single-use coupon codes"""
+    if 'user_id' not in session:
+        flash('Please log in as admin', 'warning')
+        return redirect(url_for('login'))
+    
+    user = get_current_user()
+    if not user or not user.is_admin():
+        flash('Access denied', 'error')
+        return redirect(url_for('home'))
+    
+    if request.method == 'POST':
+        try:
+            discount_type = request.form.get('discount_type', 'fixed')
+            expires_at = None
+            if request.form.get('expires_at'):
+                expires_at = datetime.strptime(request.form.get('expires_at'), '%Y-%m-%d')
+            
+            result = bulk_coupons.create_campaign(
+                request.form.get('campaign', '').strip(),
+                int(request.form.get('count', 0)),
+                prefix=request.form.get('prefix', ''),
+                length=int(request.form.get('length', bulk_coupons.DEFAULT_CODE_LENGTH)),
+                description=request.form.get('description', '').strip(),
+                discount_type=discount_type,
+                discount_value=float(request.form.get('discount_value') or 0),
+                min_order_amount=float(request.form.get('min_order_amount') or 0),
+                max_discount=float(request.form.get('max_discount')) if request.form.get('max_discount') else None,
+                expires_at=expires_at,
+                free_item_category=request.form.get('free_item_category') if discount_type == 'free_item_category' else None,
+                free_item_qty=int(request.form.get('free_item_qty', 1)) if discount_type == 'free_item_category' else None
+            )
+            app.logger.info(f"Bulk coupons: {result}")
+            flash(f'Created {result}', 'success')
+            return redirect(url_for('admin_promotions'))
+            
+        except ValueError as e:
+            flash(str(e), 'error')
+        except Exception as e:
+            app.logger.error(f"Bulk coupon error: {e}")
+            flash('Error generating coupons. Please try again.', 'error')
+    
+    categories = get_categories()
+    return render_template('admin_bulk_promotions.html',
+                         categories=categories,
+                         max_campaign_size=bulk_coupons.MAX_CAMPAIGN_SIZE,
+                         default_length=bulk_coupons.DEFAULT_CODE_LENGTH)
+
+@app.route('/admin/promotions/campaigns/<campaign>/codes.csv')
+def export_campaign_codes(campaign):
+    """Download a campaign's codes as CSV"""
+    if 'user_id' not in session:
+        flash('Please log in as admin', 'warning')
+        return redirect(url_for('login'))
+    
+    user = get_current_user()
+    if not user or not user.is_admin():
+        flash('Access denied', 'error')
+        return redirect(url_for('home'))
+    
+    def generate():
+        yield 'code,used,expires_at\n'
+        for code, used_count, expires_at in bulk_coupons.campaign_codes(campaign):
+            yield f"{code},{used_count},{expires_at.strftime('%Y-%m-%d') if expires_at else ''}\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={campaign}-codes.csv'})
+
 # Coupon Usage Tracking Routes
 @app.route('/admin/coupon-usage')
 def admin_coupon_usage():
@@ -1413,58 +1606,8 @@ def admin_coupon_usage():
         flash('Access denied', 'error')
         return redirect(url_for('home'))
     
-    # Get filter parameters
-    search_term = request.args.get('search', '').strip()
-    coupon_filter = request.args.get('coupon', 'all')
-    user_type_filter = request.args.get('user_type', 'all')  # all, registered, guest
-    date_filter = request.args.get('date', 'all')  # all, today, week, month
-    sort_by = request.args.get('sort', 'recent')  # recent, oldest, discount_high, discount_low
-    
-    # Base query
-    query = CouponUsage.query.join(Promotion).join(Order)
-    
-    # Apply search filter
-    if search_term:
-        query = query.filter(
-            db.or_(
-                CouponUsage.coupon_code.ilike(f'%{search_term}%'),
-                CouponUsage.username.ilike(f'%{search_term}%'),
-                CouponUsage.guest_name.ilike(f'%{search_term}%'),
-                CouponUsage.order_number.ilike(f'%{search_term}%'),
-                Promotion.description.ilike(f'%{search_term}%')
-            )
-        )
-    
-    # Apply coupon filter
-    if coupon_filter != 'all':
-        query = query.filter(CouponUsage.coupon_code == coupon_filter)
-    
-    # Apply user type filter
-    if user_type_filter == 'registered':
-        query = query.filter(CouponUsage.user_id.isnot(None))
-    elif user_type_filter == 'guest':
-        query = query.filter(CouponUsage.user_id.is_(None))
-    
-    # Apply date filter
-    if date_filter == 'today':
-        today = datetime.now().date()
-        query = query.filter(CouponUsage.used_at >= today)
-    elif date_filter == 'week':
-        week_ago = datetime.now() - timedelta(days=7)
-        query = query.filter(CouponUsage.used_at >= week_ago)
-    elif date_filter == 'month':
-        month_ago = datetime.now() - timedelta(days=30)
-        query = query.filter(CouponUsage.used_at >= month_ago)
-    
-    # Apply sorting
-    if sort_by == 'oldest':
-        query = query.order_by(CouponUsage.used_at.asc())
-    elif sort_by == 'discount_high':
-        query = query.order_by(CouponUsage.discount_amount.desc())
-    elif sort_by == 'discount_low':
-        query = query.order_by(CouponUsage.discount_amount.asc())
-    else:  # recent (default)
-        query = query.order_by(CouponUsage.used_at.desc())
+    filters = coupon_usage_filters(request.args)
+    query = filtered_coupon_usage(filters)
     
     # Get paginated results
     page = request.args.get('page', 1, type=int)
@@ -1473,44 +1616,31 @@ def admin_coupon_usage():
         page=page, per_page=per_page, error_out=False
     )
     
-    # Calculate statistics
-    total_usage_count = CouponUsage.query.count()
-    total_discount_amount = db.session.query(
-        db.func.sum(CouponUsage.discount_amount)
-    ).scalar() or 0
-    
-    # Today's stats
-    today = datetime.now().date()
-    today_usage = CouponUsage.query.filter(CouponUsage.used_at >= today).count()
-    today_discount = db.session.query(
-        db.func.sum(CouponUsage.discount_amount)
-    ).filter(CouponUsage.used_at >= today).scalar() or 0
+    # Statistics from the precomputed per-day coupon aggregate
+    all_time, today_totals = CouponDailyUsage.totals(ist_now().date())
+    total_usage_count = all_time.usage_count if all_time else 0
+    total_discount_amount = all_time.discount_total if all_time else 0
+    today_usage = today_totals.usage_count if today_totals else 0
+    today_discount = today_totals.discount_total if today_totals else 0
     
     # Top coupons (most used)
-    top_coupons = db.session.query(
-        CouponUsage.coupon_code,
-        db.func.count(CouponUsage.id).label('usage_count'),
-        db.func.sum(CouponUsage.discount_amount).label('total_discount')
-    ).group_by(CouponUsage.coupon_code)\
-     .order_by(db.func.count(CouponUsage.id).desc())\
-     .limit(5).all()
-    
-    # Get unique coupon codes for filter dropdown
-    unique_coupons = db.session.query(CouponUsage.coupon_code)\
-                               .distinct()\
-                               .order_by(CouponUsage.coupon_code)\
-                               .all()
+    top_coupons = CouponDailyUsage.top_coupons(5)
+    
+    # Coupon codes for the filter dropdown: every code with usage, from the all-time aggregate rows
+    unique_coupons = CouponDailyUsage.used_codes()
+    if filters.coupon != 'all' and filters.coupon not in unique_coupons:
+        unique_coupons.append(filters.coupon)
     
     # Average discount per usage
     avg_discount = total_discount_amount / total_usage_count if total_usage_count > 0 else 0
     
     return render_template('admin_coupon_usage.html',
                          usage_records=usage_records,
-                         search_term=search_term,
-                         coupon_filter=coupon_filter,
-                         user_type_filter=user_type_filter,
-                         date_filter=date_filter,
-                         sort_by=sort_by,
+                         search_term=filters.search,
+                         coupon_filter=filters.coupon,
+                         user_type_filter=filters.user_type,
+                         date_filter=filters.date,
+                         sort_by=filters.sort,
                          unique_coupons=unique_coupons,
                          total_usage_count=total_usage_count,
                          total_discount_amount=total_discount_amount,
@@ -1519,28 +1649,339 @@ def admin_coupon_usage():
                          top_coupons=top_coupons,
                          avg_discount=avg_discount)
 
+@app.route('/admin/coupon-usage/export.<fmt>')
+def export_coupon_usage(fmt):
+    """Download the filtered coupon usage records"""
+    if 'user_id' not in session:
+        flash('Please log in as admin', 'warning')
+        return redirect(url_for('login'))
+    
+    user = get_current_user()
+    if not user or not user.is_admin():
+        flash('Access denied', 'error')
+        return redirect(url_for('home'))
+    
+    if fmt not in exports.EXPORT_FORMATS:
+        abort(404)
+    
+    query = filtered_coupon_usage(coupon_usage_filters(request.args))
+    return exports.export_response(exports.column_rows(query, exports.COUPON_USAGE_COLUMNS),
+                                   exports.COUPON_USAGE_COLUMNS, 'coupon-usage', fmt)
+
 # API Routes for AJAX calls (minimal usage as per guidelines)
 
 @app.route('/api/cart_count')
 def api_cart_count():
-    """API endpoint for cart count"""
-    count = get_cart_count()
-    return jsonify({'count': count})
+    """API endpoint for cart count, revalidated against the cart summary version"""
+    count, _, version = get_cart_summary()
+    response = jsonify({'count': count})
+    response.set_etag(f"cart-{session.get('user_id', 0)}-{version}-{count}")
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+def _cart_increase_error(menu_item):
+    """Why a cart line cannot grow right now, or None"""
+    if not is_store_open():
+        return 'Sorry, we are currently closed'
+    if not menu_item.in_stock:
+        return f'{menu_item.name} is not available'
+    return None
+
+@app.route('/api/cart', methods=['POST'])
+def api_cart():
+    """Apply a batch of cart changes in one transaction and return the new cart.
+
+    Body: {"operations": [{"item_id": 1, "quantity": 2, "mode": "set" | "add"}]}
+    "set" replaces the line quantity (0 removes it), "add" increments it.
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Please log in to update your cart'}), 401
+
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations or len(operations) > 50:
+        return jsonify({'success': False, 'error': 'Expected 1-50 operations'}), 400
+
+    # Collapse the batch to one change per item, in order
+    catalog = get_menu_catalog()
+    changes = {}
+    for operation in operations:
+        try:
+            menu_item = catalog.get(operation.get('item_id'))
+            quantity = int(operation.get('quantity'))
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Invalid operation'}), 400
+        mode = operation.get('mode', 'set')
+        if not menu_item or mode not in ('set', 'add') or not 0 <= quantity <= 10:
+            return jsonify({'success': False, 'error': 'Invalid operation'}), 400
+
+        if mode == 'add':
+            error = _cart_increase_error(menu_item)
+            if error:
+                return jsonify({'success': False, 'error': error}), 409
+            if menu_item.id in changes:
+                changes[menu_item.id][1] += quantity
+            else:
+                changes[menu_item.id] = ['add', quantity]
+        else:
+            changes[menu_item.id] = ['set', quantity]
+
+    user_id = session['user_id']
+
+    # A "set" that raises a line needs the same checks as "add"; decreases and removals do not
+    set_quantities = {item_id: quantity for item_id, (mode, quantity) in changes.items()
+                      if mode == 'set' and quantity > 0}
+    if set_quantities:
+        current = dict(db.session.query(CartItem.menu_item_id, CartItem.quantity)
+                       .filter(CartItem.user_id == user_id, CartItem.menu_item_id.in_(set_quantities)).all())
+        for item_id, quantity in set_quantities.items():
+            if quantity > current.get(item_id, 0):
+                error = _cart_increase_error(catalog.get(item_id))
+                if error:
+                    return jsonify({'success': False, 'error': error}), 409
+    try:
+        CartItem.set_quantities(user_id, {item_id: quantity for item_id, (mode, quantity) in changes.items()
+                                          if mode == 'set'})
+        CartItem.add_quantities(user_id, {item_id: quantity for item_id, (mode, quantity) in changes.items()
+                                          if mode == 'add' and quantity > 0})
+        summary = CartSummary.refresh(user_id)
+        count, subtotal, version = summary.item_count, summary.subtotal, summary.version
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Cart batch update failed: {e}")
+        return jsonify({'success': False, 'error': 'Could not update cart'}), 500
+    invalidate_cart_cache()
+    cart_items = get_cart_items()
+    quote = price_cart(cart_items)
+
+    return jsonify({
+        'success': True,
+        'cart': {
+            'count': count,
+            'subtotal': subtotal,
+            'delivery_charges': quote.delivery_charges,
+            'total': quote.total,
+            'version': version,
+            'items': [
+                {'id': item['id'], 'quantity': item['quantity'], 'total': item['total']}
+                for item in cart_items
+            ]
+        }
+    })
+
+@app.route('/api/menu_search')
+def api_menu_search():
+    """Typo-tolerant menu suggestions for the search box"""
+    query = request.args.get('q', '').strip()[:100]
+    limit = min(request.args.get('limit', 8, type=int) or 8, 20)
+    if not query:
+        return jsonify({'query': query, 'results': []})
+
+    items = get_menu_catalog().search(query, session.get('veg_mode', False), limit)
+    return jsonify({
+        'query': query,
+        'results': [{
+            'id': item.id,
+            'name': item.name,
+            'category': item.category,
+            'price': item.price,
+            'emoji': item.emoji,
+            'is_vegetarian': item.is_vegetarian,
+            'in_stock': item.in_stock
+        } for item in items]
+    })
+
+@app.route('/api/admin/menu_bulk', methods=['POST'])
+def api_admin_menu_bulk():
+    """Bulk price, stock and category changes for menu items; dry_run returns the diff only"""
+    user = get_current_user()
+    if not user or not user.is_admin():
+        return jsonify({'error': 'Access denied'}), 403
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    
+    # Only real booleans (or 'true'/'false'); bool('false') would be True
+    in_stock = data.get('in_stock')
+    if isinstance(in_stock, str) and in_stock.lower() in ('true', 'false'):
+        in_stock = in_stock.lower() == 'true'
+    if in_stock is not None and not isinstance(in_stock, bool):
+        return jsonify({'error': 'in_stock must be true or false'}), 400
+    for field in ('price_mode', 'rounding', 'category'):
+        if data.get(field) is not None and not isinstance(data.get(field), str):
+            return jsonify({'error': f'{field} must be text'}), 400
+    try:
+        price_value = float(data.get('price_value') or 0)
+    except (TypeError, ValueError):
+        price_value = None
+    if price_value is None or not math.isfinite(price_value):
+        return jsonify({'error': 'price_value must be a number'}), 400
+    
+    try:
+        result = bulk_menu.bulk_update_menu(
+            data.get('item_ids') or [],
+            price_mode=data.get('price_mode') or None,
+            price_value=price_value,
+            rounding=data.get('rounding') or 'none',
+            in_stock=in_stock,
+            category=data.get('category') or None,
+            dry_run=data.get('dry_run') is not False
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(result.to_dict())
+
+@app.route('/api/admin/order_changes')
+def api_admin_order_changes():
+    """Order changes since an event cursor, for live admin pages"""
+    user = get_current_user()
+    if not user or not user.is_admin():
+        return jsonify({'error': 'Access denied'}), 403
+    
+    since = request.args.get('since', 0, type=int)
+    view = request.args.get('view', 'card')  # card (admin_orders) or row (dashboard)
+    limit = 200
+    
+    events = OrderEvent.query.filter(OrderEvent.position > since)\
+                             .order_by(OrderEvent.position)\
+                             .limit(limit).all()
+    if not events:
+        return jsonify({'cursor': since, 'orders': [], 'has_more': False})
+    
+    # Collapse several events for one order into a single patch
+    order_ids = list(dict.fromkeys(event.order_id for event in events))
+    new_order_ids = {event.order_id for event in events if event.event_type == 'created'}
+    orders = Order.query.options(
+        selectinload(Order.order_items).selectinload(OrderItem.menu_item)
+    ).filter(Order.id.in_(order_ids)).order_by(Order.id).all()
+    
+    template = '_admin_order_row.html' if view == 'row' else '_admin_order_card.html'
+    return jsonify({
+        'cursor': events[-1].position,
+        'has_more': len(events) == limit,
+        'pending_count': DailySales.status_count('pending'),
+        'orders': [
+            {
+                'id': order.id,
+                'order_number': order.order_number,
+                'status': order.status,
+                'is_new': order.id in new_order_ids,
+                'html': render_template(template, order=order)
+            }
+            for order in orders
+        ]
+    })
+
+def _order_status_payloads(order_numbers):
+    """Status payloads keyed by order number, from one grouped query"""
+    rows = db.session.query(
+        Order.order_number, Order.status, Order.payment_status,
+        Order.created_at, Order.total_amount,
+        db.func.count(OrderItem.id).label('items_count')
+    ).outerjoin(OrderItem, OrderItem.order_id == Order.id)\
+     .filter(Order.order_number.in_(order_numbers))\
+     .group_by(Order.id).all()
+    
+    return {
+        row.order_number: {
+            'status': row.status,
+            'status_display': row.status.title().replace('_', ' '),
+            'progress_percentage': get_order_progress_percentage(row.status),
+            'payment_status': row.payment_status,
+            'estimated_time': '30-45 minutes',
+            'last_updated': row.created_at.strftime('%I:%M %p IST'),
+            'order_items_count': row.items_count,
+            'total_amount': row.total_amount
+        }
+        for row in rows
+    }
 
 @app.route('/api/order_status/<order_number>')
 def api_order_status(order_number):
     """API endpoint for real-time order status"""
-    order = Order.query.filter_by(order_number=order_number).first_or_404()
-    
+    payloads = _order_status_payloads([order_number])
+    if order_number not in payloads:
+        abort(404)
+    return jsonify(payloads[order_number])
+
+@app.route('/api/order_statuses')
+def api_order_statuses():
+    """Batch order status for several orders, with ETag revalidation"""
+    order_numbers = [n.strip() for n in request.args.get('orders', '').split(',') if n.strip()][:50]
+    if not order_numbers:
+        return jsonify({'orders': {}})
+    
+    payloads = _order_status_payloads(order_numbers)
+    response = jsonify({'orders': payloads})
+    
+    # Unchanged polls get a bodyless 304
+    digest = hashlib.md5(json.dumps(payloads, sort_keys=True).encode()).hexdigest()
+    response.set_etag(digest)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def _subscribed_orders():
+    """Resolve the ?orders= list of order numbers to ({order ids}, {order_number: status})"""
+    order_numbers = [n.strip() for n in request.args.get('orders', '').split(',') if n.strip()][:50]
+    if not order_numbers:
+        return set(), {}
+    rows = db.session.query(Order.id, Order.order_number, Order.status)\
+                     .filter(Order.order_number.in_(order_numbers)).all()
+    return {row.id for row in rows}, {row.order_number: row.status for row in rows}
+
+@app.route('/api/order_events')
+def api_order_events():
+    """Server-Sent Events stream of status changes for the given orders"""
+    order_ids, statuses = _subscribed_orders()
+    if not order_ids:
+        return jsonify({'error': 'No matching orders'}), 404
+    
+    # EventSource resends the last id it saw when reconnecting
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', 0, type=int)
+    order_event_broker.start(app)
+    
+    def stream(since):
+        yield 'retry: 5000\n\n'
+        # Close after a while so reconnects rebalance across workers
+        deadline = datetime.now() + timedelta(minutes=30)
+        while datetime.now() < deadline:
+            if all(status in TERMINAL_STATUSES for status in statuses.values()):
+                yield 'event: done\ndata: {}\n\n'
+                return
+            events, since = order_event_broker.wait(order_ids, since, timeout=15)
+            if not events:
+                yield ': keepalive\n\n'
+            for payload in events:
+                statuses[payload['order_number']] = payload['status']
+                yield format_sse(payload)
+    
+    return Response(stream(since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/order_events/poll')
+def api_order_events_poll():
+    """Long-polling fallback for clients without EventSource"""
+    order_ids, statuses = _subscribed_orders()
+    if not order_ids:
+        return jsonify({'error': 'No matching orders'}), 404
+    
+    since = request.args.get('since', 0, type=int)
+    if all(status in TERMINAL_STATUSES for status in statuses.values()):
+        return jsonify({'cursor': since, 'events': [], 'done': True})
+    
+    order_event_broker.start(app)
+    events, cursor = order_event_broker.wait(order_ids, since, timeout=25)
+    for payload in events:
+        statuses[payload['order_number']] = payload['status']
     return jsonify({
-        'status': order.status,
-        'status_display': order.status.title().replace('_', ' '),
-        'progress_percentage': get_order_progress_percentage(order.status),
-        'payment_status': order.payment_status,
-        'estimated_time': '30-45 minutes',
-        'last_updated': order.created_at_ist.strftime('%I:%M %p IST'),
-        'order_items_count': len(order.order_items),
-        'total_amount': order.total_amount
+        'cursor': cursor,
+        'events': events,
+        'done': all(status in TERMINAL_STATUSES for status in statuses.values())
     })
 
 @app.route('/api/validate_coupon', methods=['POST'])
@@ -1558,7 +1999,7 @@ def api_validate_coupon():
             })
         
         # Find promotion
-        promotion = Promotion.query.filter_by(code=coupon_code).first()
+        promotion = get_promotion_by_code(coupon_code)
         
         if not promotion:
             return jsonify({
@@ -1583,16 +2024,31 @@ def api_validate_coupon():
                     'message': 'This coupon has reached its usage limit'
                 })
         
+        # The only query on the cached path: an indexed probe of the user's redemptions
+        if has_redeemed_promotion(session.get('user_id'), promotion):
+            return jsonify({
+                'valid': False,
+                'message': 'You have already used this coupon. Each coupon can only be used once per user.'
+            })
+        
+        # The server-side cart is authoritative; the posted subtotal is only used without one
+        cart_items = get_cart_items()
+        if cart_items:
+            subtotal = sum(item['total'] for item in cart_items)
+        
         if subtotal < promotion.min_order_amount:
             return jsonify({
                 'valid': False,
                 'message': f'Minimum order amount is ₹{promotion.min_order_amount:.0f}'
             })
         
-        # Get cart items for discount calculation
-        user_id = session.get('user_id')
-        cart_db_items = CartItem.query.filter_by(user_id=user_id).all() if user_id else []
-        discount, meta = promotion.calculate_discount(subtotal, cart_db_items)
+        # Price the cart the same way checkout will
+        if cart_items:
+            quote = price_cart(cart_items, promotion)
+        else:
+            quote = pricing.quote([pricing.CartLine(None, 1, subtotal, None)],
+                                  pricing.promotion_terms(promotion), get_pricing_settings())
+        discount, meta = quote.discount, quote.discount_meta
         
         # Format discount message based on meta information
         if meta and meta['type'] == 'percentage':
@@ -1606,7 +2062,8 @@ def api_validate_coupon():
             'valid': True,
             'message': f'Success! {discount_text} applied to your order',
             'discount': discount,
-            'new_total': subtotal - discount,
+            'delivery_charges': quote.delivery_charges,
+            'new_total': quote.total,
             'code': coupon_code
         })
             
@@ -0,0 +1,38 @@
+// Subscribe to pushed order status changes.
+// Uses Server-Sent Events where available and falls back to long-polling.
+// Returns a function that stops the subscription.
+function subscribeToOrderEvents(orderNumbers, cursor, onEvent) {
+    const query = `orders=${encodeURIComponent(orderNumbers.join(','))}`;
+
+    if (window.EventSource) {
+        const source = new EventSource(`/api/order_events?${query}&since=${cursor}`);
+        source.addEventListener('order_status', (event) => {
+            onEvent(JSON.parse(event.data));
+        });
+        source.addEventListener('done', () => source.close());
+        return () => source.close();
+    }
+
+    let active = true;
+    async function poll() {
+        while (active) {
+            try {
+                const response = await fetch(`/api/order_events/poll?${query}&since=${cursor}`);
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                const data = await response.json();
+                cursor = data.cursor;
+                data.events.forEach(onEvent);
+                if (data.done) {
+                    return;
+                }
+            } catch (error) {
+                console.error('Error waiting for order updates:', error);
+                await new Promise(resolve => setTimeout(resolve, 5000));
+            }
+        }
+    }
+    poll();
+    return () => { active = false; };
+}
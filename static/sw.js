@@ -1,4 +1,4 @@
-const CACHE_NAME = 'biryani-club-v2';
+const CACHE_NAME = 'biryani-club-v3';
 const urlsToCache = [
     '/',
     '/menu',
@@ -30,6 +30,11 @@ self.addEventListener('install', function(event) {
 
 // Fetch event with improved caching strategy
 self.addEventListener('fetch', function(event) {
+    // Never cache API calls; order event streams must reach the network
+    if (new URL(event.request.url).pathname.startsWith('/api/')) {
+        return;
+    }
+
     event.respondWith(
         caches.match(event.request)
             .then(function(response) {
@@ -0,0 +1,83 @@
+import math
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Runs against its own database: it registers customers and places real orders
+os.environ['DATABASE_URL'] = os.environ.get('STRESS_DATABASE_URL', 'sqlite:///stress_coupon_limit.db')
+
+from app import app, db
+from models import MenuItem, Order, Promotion, CouponUsage
+from outbox import process_batch
+from promotion_catalog import invalidate_promotion_catalog
+
+MAX_ATTEMPTS = 20
+
+def create_limited_coupon(limit):
+    """A fresh ₹50-off coupon that may be used limit times in total"""
+    with app.app_context():
+        promotion = Promotion(code=f'STRESS{uuid.uuid4().hex[:8].upper()}', description='Coupon limit stress test',
+                              discount_type='fixed', discount_value=50, min_order_amount=0,
+                              usage_limit=limit, used_count=0, is_active=True)
+        db.session.add(promotion)
+        db.session.commit()
+        invalidate_promotion_catalog()
+        return promotion.code
+
+def customer_with_cart(name):
+    """A logged-in test client with enough in its cart to pass the minimum order"""
+    with app.app_context():
+        item = MenuItem.query.filter_by(in_stock=True).order_by(MenuItem.price.desc()).first()
+        item_id, quantity = item.id, min(math.ceil(250 / item.price), 10)
+    client = app.test_client()
+    client.post('/register', data={'username': name, 'email': f'{name}@stress.test', 'password': 'stress123',
+                                   'confirm_password': 'stress123', 'full_name': name, 'phone': ''})
+    client.post('/login', data={'username': name, 'password': 'stress123'})
+    client.post('/add_to_cart', data={'item_id': item_id, 'quantity': quantity})
+    return client
+
+def checkout(client, code, barrier):
+    """Submit checkout until it is placed or refused; a lock error (SQLite) is retried like a user would"""
+    barrier.wait()
+    for _ in range(MAX_ATTEMPTS):
+        response = client.post('/checkout', data={'customer_name': 'Stress Test', 'customer_phone': '9876543210',
+                                                  'customer_address': 'Load test lane', 'payment_method': 'cash',
+                                                  'coupon_code': code})
+        if '/order_confirmation/' in response.location:
+            return 'placed'
+        with client.session_transaction() as flask_session:
+            messages = [message for _, message in flask_session.pop('_flashes', [])]
+        if not any('error occurred' in message for message in messages):
+            return 'refused'
+    return 'gave up'
+
+def stress_coupon_limit(customers=20, limit=5):
+    """Fire parallel checkouts for one coupon and check it is used exactly limit times"""
+    code = create_limited_coupon(limit)
+    run = uuid.uuid4().hex[:6]
+    clients = [customer_with_cart(f'stress_{run}_{n}') for n in range(customers)]
+    barrier = threading.Barrier(customers)
+    with ThreadPoolExecutor(max_workers=customers) as pool:
+        outcomes = list(pool.map(lambda client: checkout(client, code, barrier), clients))
+
+    with app.app_context():
+        while process_batch():  # Usage rows are written by the outbox worker
+            pass
+        orders = Order.query.filter_by(coupon_code=code).count()
+        usages = CouponUsage.query.filter_by(coupon_code=code).count()
+        used_count = db.session.query(Promotion.used_count).filter_by(code=code).scalar()
+
+    print(f"{customers} parallel checkouts for {code} (limit {limit}): "
+          f"{outcomes.count('placed')} placed, {outcomes.count('refused')} refused")
+    assert 'gave up' not in outcomes, "A checkout kept failing with errors"
+    assert outcomes.count('placed') == limit, f"{outcomes.count('placed')} checkouts succeeded"
+    assert orders == limit, f"{orders} orders carry the coupon"
+    assert usages == limit, f"{usages} coupon usage rows recorded"
+    assert used_count == limit, f"used_count is {used_count}"
+    print(f"✓ Exactly {limit} orders, usage rows and counted uses")
+
+if __name__ == "__main__":
+    print("Stress testing the coupon usage limit...")
+    stress_coupon_limit(customers=int(os.environ.get('STRESS_CUSTOMERS', 20)),
+                        limit=int(os.environ.get('STRESS_COUPON_LIMIT', 5)))
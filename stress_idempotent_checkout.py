@@ -0,0 +1,106 @@
+import math
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Runs against its own database: it registers a customer and places real orders
+os.environ['DATABASE_URL'] = os.environ.get('STRESS_DATABASE_URL', 'sqlite:///stress_idempotent_checkout.db')
+
+from app import app, db
+from models import MenuItem, Order, OrderEvent, DailySales, Promotion, CouponUsage
+from outbox import process_batch
+from promotion_catalog import invalidate_promotion_catalog
+
+MAX_ATTEMPTS = 20
+
+def logged_in_clients(count):
+    """count test clients sharing one customer's session, with a cart above the minimum order"""
+    name = f'replay_{uuid.uuid4().hex[:6]}'
+    with app.app_context():
+        item = MenuItem.query.filter_by(in_stock=True).order_by(MenuItem.price.desc()).first()
+        item_id, quantity = item.id, min(math.ceil(250 / item.price), 10)
+    client = app.test_client()
+    client.post('/register', data={'username': name, 'email': f'{name}@stress.test', 'password': 'stress123',
+                                   'confirm_password': 'stress123', 'full_name': name, 'phone': ''})
+    client.post('/login', data={'username': name, 'password': 'stress123'})
+    client.post('/add_to_cart', data={'item_id': item_id, 'quantity': quantity})
+    cookie = client.get_cookie('session').value
+    clients = [client]
+    for _ in range(count - 1):
+        clients.append(app.test_client())
+        clients[-1].set_cookie('session', cookie)
+    return name, clients
+
+def create_coupon():
+    with app.app_context():
+        promotion = Promotion(code=f'REPLAY{uuid.uuid4().hex[:8].upper()}', description='Idempotency stress test',
+                              discount_type='fixed', discount_value=50, min_order_amount=0,
+                              used_count=0, is_active=True)
+        db.session.add(promotion)
+        db.session.commit()
+        invalidate_promotion_catalog()
+        return promotion.code
+
+def submit(client, url, form, barrier):
+    """POST once the others are ready; resubmit the same form on a server error (SQLite lock), like a user would"""
+    barrier.wait()
+    for _ in range(MAX_ATTEMPTS):
+        response = client.post(url, data=form)
+        if response.status_code == 302:
+            return response.location
+    return None
+
+def fire(clients, url, form):
+    barrier = threading.Barrier(len(clients))
+    with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        return list(pool.map(lambda client: submit(client, url, form, barrier), clients))
+
+def stress_checkout_replays(submissions=10):
+    """Identical checkout submissions (one idempotency key) must place one order and use the coupon once"""
+    name, clients = logged_in_clients(submissions)
+    code = create_coupon()
+    form = {'customer_name': 'Stress Test', 'customer_phone': '9876543210', 'customer_address': 'Load test lane',
+            'payment_method': 'upi', 'coupon_code': code, 'idempotency_key': uuid.uuid4().hex}
+    locations = fire(clients, '/checkout', form)
+
+    with app.app_context():
+        while process_batch():  # Usage rows are written by the outbox worker
+            pass
+        orders = Order.query.filter_by(coupon_code=code).all()
+        usages = CouponUsage.query.filter_by(coupon_code=code).count()
+        used_count = db.session.query(Promotion.used_count).filter_by(code=code).scalar()
+
+    print(f"{submissions} identical checkouts for {name}: {len(orders)} order(s), redirects {sorted(set(map(str, locations)))}")
+    assert len(orders) == 1, f"{len(orders)} orders placed"
+    assert usages == 1 and used_count == 1, f"coupon used {used_count} times with {usages} usage rows"
+    assert set(locations) == {f'/upi_payment/{orders[0].id}'}, "Submissions were not sent to the same order"
+    print("✓ One order, one coupon use, every submission redirected to it")
+    return clients, orders[0].id
+
+def stress_payment_replays(clients, order_id):
+    """Repeated payment confirmations must confirm the order and count its revenue once"""
+    with app.app_context():
+        revenue = db.session.query(DailySales.confirmed_revenue).filter_by(
+            day=DailySales.ALL_TIME, status='pending').scalar() or 0
+    locations = fire(clients, f'/confirm_payment/{order_id}', {})
+
+    with app.app_context():
+        order = db.session.get(Order, order_id)
+        payment_events = OrderEvent.query.filter_by(order_id=order_id, event_type='payment').count()
+        counted = (db.session.query(DailySales.confirmed_revenue).filter_by(
+            day=DailySales.ALL_TIME, status='pending').scalar() or 0) - revenue
+        total = order.total_amount
+        payment_status = order.payment_status
+
+    print(f"{len(clients)} payment confirmations: {payment_events} payment event(s), ₹{counted:g} revenue counted")
+    assert set(locations) == {f'/order_confirmation/{order_id}'}, "Confirmations were not sent to the order"
+    assert payment_status == 'confirmed', f"payment_status is {payment_status}"
+    assert payment_events == 1, f"{payment_events} payment events recorded"
+    assert abs(counted - total) < 0.01, f"₹{counted:g} counted for a ₹{total:g} order"
+    print("✓ Payment confirmed once")
+
+if __name__ == "__main__":
+    print("Stress testing duplicate checkout and payment submissions...")
+    clients, order_id = stress_checkout_replays(int(os.environ.get('STRESS_SUBMISSIONS', 10)))
+    stress_payment_replays(clients, order_id)
@@ -3,6 +3,7 @@
 
 from app import app, db
 from models import MenuItem
+from menu_catalog import invalidate_menu_catalog
 
 # Items that should be marked as non-vegetarian
 NON_VEG_KEYWORDS = [
@@ -37,6 +38,7 @@ with app.app_context():
     # Commit changes
     if updated_count > 0:
         db.session.commit()
+        invalidate_menu_catalog()
         print(f"\n✅ Successfully updated {updated_count} menu items!")
     else:
         print("\n✅ All menu items are already correctly classified!")
@@ -8,6 +8,7 @@ Update menu pricing with psychological pricing and better portion naming
 
 from app import app, db
 from models import MenuItem
+from menu_catalog import invalidate_menu_catalog
 import math
 
 def apply_psychological_price(price):
@@ -66,6 +67,7 @@ def update_all_prices():
         # Commit all changes
         try:
             db.session.commit()
+            invalidate_menu_catalog()
             print(f"\n✅ Successfully updated {updated_count} menu items!")
             print("   - All prices increased by ~15% with psychological pricing")
             print("   - Renamed Small→Half, Large→Full for better perception")
@@ -5,9 +5,12 @@ import base64
 from datetime import datetime, timedelta
 import re
 import pytz
-from flask import session
-from models import User, StoreSettings, CartItem, MenuItem, Promotion
+from flask import session, g
+from models import User, StoreSettings, CartItem, CartSummary, MenuItem, Promotion, CouponUsage, Order
 from app import db
+from menu_catalog import get_menu_catalog
+from promotion_catalog import find_promotion
+import pricing
 
 def ist_now():
     """Get current IST time"""
@@ -37,38 +40,89 @@ def generate_qr_code(data, amount=None):
     return None
 
 def is_store_open():
-    """Check if store is currently open"""
-    try:
-        store_status = StoreSettings.get_setting('store_open', 'true')
-        return store_status and store_status.lower() == 'true'
-    except:
-        return True
+    """Check if store is currently open (computed once per request)"""
+    if '_store_open' not in g:
+        try:
+            store_status = StoreSettings.get_setting('store_open', 'true')
+            g._store_open = bool(store_status) and store_status.lower() == 'true'
+        except:
+            g._store_open = True
+    return g._store_open
 
 def get_current_user():
-    """Get current logged in user"""
-    if 'user_id' in session:
-        return User.query.get(session['user_id'])
-    return None
+    """Get current logged in user (loaded once per request)"""
+    if 'user_id' not in session:
+        return None
+    if '_current_user' not in g:
+        g._current_user = User.query.get(session['user_id'])
+    return g._current_user
 
 def get_cart_items(user_id=None):
-    """Get cart items for a user"""
-    if not user_id and 'user_id' in session:
-        user_id = session['user_id']
-
-    if user_id:
-        cart_items = CartItem.query.filter_by(user_id=user_id).join(MenuItem).all()
-        return [
-            {
-                'id': item.menu_item.id,
-                'name': item.menu_item.name,
-                'price': item.menu_item.price,
-                'quantity': item.quantity,
-                'total': item.total,
-                'emoji': item.menu_item.emoji
-            }
-            for item in cart_items
-        ]
-    return []
+    """Get cart items for a user (the session user's cart is loaded once per request)"""
+    session_user_id = session.get('user_id')
+    if not user_id:
+        user_id = session_user_id
+
+    if not user_id:
+        return []
+
+    is_session_cart = user_id == session_user_id
+    if is_session_cart and '_cart_items' in g:
+        return g._cart_items
+
+    # Only quantities come from the DB; names and prices come from the menu snapshot
+    cart_rows = db.session.query(CartItem.menu_item_id, CartItem.quantity)\
+                          .filter_by(user_id=user_id)\
+                          .order_by(CartItem.id)\
+                          .all()
+    catalog = get_menu_catalog()
+    items = []
+    for menu_item_id, quantity in cart_rows:
+        menu_item = catalog.get(menu_item_id)
+        if not menu_item:
+            continue
+        items.append({
+            'id': menu_item.id,
+            'name': menu_item.name,
+            'price': menu_item.price,
+            'quantity': quantity,
+            'total': quantity * menu_item.price,
+            'emoji': menu_item.emoji,
+            'category': menu_item.category
+        })
+    if is_session_cart:
+        g._cart_items = items
+    return items
+
+def invalidate_cart_cache():
+    """Drop the request's memoized cart after it has been modified"""
+    g.pop('_cart_items', None)
+    g.pop('_cart_summary', None)
+
+def get_cart_summary(user_id=None):
+    """Return (item_count, subtotal, version) from the user's stored cart summary"""
+    session_user_id = session.get('user_id')
+    if not user_id:
+        user_id = session_user_id
+
+    if not user_id:
+        return 0, 0.0, 0
+
+    is_session_cart = user_id == session_user_id
+    if is_session_cart and '_cart_summary' in g:
+        return g._cart_summary
+
+    row = db.session.query(CartSummary.item_count, CartSummary.subtotal, CartSummary.version)\
+                    .filter_by(user_id=user_id).first()
+    if row:
+        summary = (row.item_count, row.subtotal, row.version)
+    else:
+        # No summary yet (cart untouched since the table was added)
+        items = get_cart_items(user_id)
+        summary = (sum(item['quantity'] for item in items), sum(item['total'] for item in items), 0)
+    if is_session_cart:
+        g._cart_summary = summary
+    return summary
 
 def get_cart_total(user_id=None):
     """Calculate cart total for a user"""
@@ -77,13 +131,15 @@ def get_cart_total(user_id=None):
 
 def get_cart_count(user_id=None):
     """Get cart items count"""
-    cart_items = get_cart_items(user_id)
-    return sum(item['quantity'] for item in cart_items)
+    return get_cart_summary(user_id)[0]
 
-def clear_user_cart(user_id):
-    """Clear all items from user's cart"""
+def clear_user_cart(user_id, commit=True):
+    """Clear all items from user's cart (commit=False leaves the commit to the caller)"""
     CartItem.query.filter_by(user_id=user_id).delete()
-    db.session.commit()
+    CartSummary.reset(user_id)
+    if commit:
+        db.session.commit()
+    invalidate_cart_cache()
 
 def validate_phone(phone):
     """Validate phone number format"""
@@ -123,53 +179,81 @@ def find_user_by_login(identifier):
 
     return None
 
+def get_promotion_by_code(coupon_code):
+    """Find a promotion by its (case-insensitive) code; a read-only cached copy"""
+    return find_promotion(coupon_code)
+
+def get_redeemed_coupon_codes(user_id):
+    """Codes the user has already used (recorded usages plus placed, uncancelled orders)"""
+    if not user_id:
+        return frozenset()
+    codes = g.get('_redeemed_coupon_codes')
+    if codes is None or codes[0] != user_id:
+        rows = db.session.query(CouponUsage.coupon_code).filter(CouponUsage.user_id == user_id).union(
+            db.session.query(db.func.upper(Order.coupon_code))
+            .filter(Order.user_id == user_id, Order.coupon_code.isnot(None), Order.status != 'cancelled')
+        ).all()
+        codes = g._redeemed_coupon_codes = (user_id, frozenset(row[0] for row in rows))
+    return codes[1]
+
+def has_redeemed_promotion(user_id, promotion):
+    """Whether the user already used this promotion; one indexed probe at most"""
+    if not user_id:
+        return False
+    codes = g.get('_redeemed_coupon_codes')
+    if codes is not None and codes[0] == user_id:
+        return promotion.code in codes[1]
+    return Promotion.redeemed_by(user_id, promotion.id, promotion.code)
+
+def get_pricing_settings():
+    """Delivery pricing from store settings, falling back to the defaults"""
+    def setting(key, default):
+        try:
+            return float(StoreSettings.get_setting(key, default))
+        except (TypeError, ValueError):
+            return default
+    return pricing.PricingSettings(
+        base_delivery_charge=setting('base_delivery_charge', pricing.DEFAULT_BASE_DELIVERY_CHARGE),
+        free_delivery_threshold=setting('free_delivery_threshold', pricing.DEFAULT_FREE_DELIVERY_THRESHOLD)
+    )
+
+def cart_lines(cart_items):
+    """Pricing snapshot of get_cart_items() rows"""
+    return [
+        pricing.CartLine(item['id'], item['quantity'], item['price'], item['category'])
+        for item in cart_items
+    ]
+
+def price_cart(cart_items, promotion=None):
+    """Quote a cart from get_cart_items() with an optional, already validated promotion"""
+    return pricing.quote(cart_lines(cart_items), pricing.promotion_terms(promotion), get_pricing_settings())
+
 def apply_coupon(coupon_code, subtotal):
     """Apply coupon and return discount amount"""
-    if not coupon_code:
-        return 0
-
-    from models import Promotion, CartItem
-    from flask import session
-
-    # Find promotion in database
-    promotion = Promotion.query.filter_by(code=coupon_code.upper().strip()).first()
-
-    if not promotion:
+    promotion = get_promotion_by_code(coupon_code)
+    if not promotion or not promotion.is_valid:
         return 0
 
-    if not promotion.is_valid:
-        return 0
-
-    # Check minimum order amount
-    if subtotal < promotion.min_order_amount:
-        return 0
-
-    # Get cart items for discount calculation (needed for free_item_category)
-    user_id = session.get('user_id')
-    cart_items = CartItem.query.filter_by(user_id=user_id).all() if user_id else []
-    
-    discount, meta = promotion.calculate_discount(subtotal, cart_items)
+    discount, meta = pricing.calculate_discount(
+        pricing.promotion_terms(promotion), subtotal, cart_lines(get_cart_items())
+    )
     return discount
 
 def calculate_delivery_charges(subtotal):
-    """Calculate delivery charges based on order amount"""
-    if subtotal >= 250:
-        return 0  # Free delivery for orders 250rs and above
-    else:
-        return 25  # 25rs delivery charge for orders below 250rs
+    """Calculate delivery charges based on order amount and the store settings"""
+    return pricing.delivery_charge(subtotal, get_pricing_settings())
 
 def get_popular_items(limit=6):
     """Get popular menu items"""
     try:
-        return MenuItem.query.filter_by(in_stock=True).order_by(MenuItem.popularity.desc()).limit(limit).all()
+        return list(get_menu_catalog().popular[:limit])
     except:
         return []
 
 def get_categories():
     """Get all menu categories"""
     try:
-        categories = db.session.query(MenuItem.category).distinct().all()
-        return [cat[0] for cat in categories]
+        return list(get_menu_catalog().categories)
     except:
         return []
 